@@ -0,0 +1,165 @@
+'''Least-recently-used cache of numpy arrays, with an optional disk tier'''
+
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License at http://www.gnu.org/licenses for
+# more details.
+
+## Results are keyed by what they are computed from: for an image, a
+## checksum of its pixels (see checksum), so the key says what is in it,
+## not where it came from.  Each GIMP plug-in call is a process of its
+## own, so the memory tier only helps within a call; the disk tier
+## (.npy files, memory-mapped when they are read back) carries results
+## from one call, or one session, to the next.  Cached arrays are made
+## read-only, so a caller cannot change what the next one gets.
+
+from __future__ import print_function, division
+import hashlib
+import os
+from collections import OrderedDict
+import numpy as np
+
+def checksum(arr):
+    '''hex digest of the shape, dtype, and bytes of an array'''
+    arr = np.ascontiguousarray(arr)
+    digest = hashlib.sha1(repr((arr.shape,arr.dtype.str)).encode('ascii'))
+    digest.update(memoryview(arr.reshape(-1).view(np.uint8)))
+    return digest.hexdigest()
+
+def freeze(arr):
+    '''arr, made read-only'''
+    arr.flags.writeable = False
+    return arr
+
+def touch(path):
+    '''mark a file as just used (its modification time is its last use)'''
+    try:
+        os.utime(path,None)
+    except OSError:
+        pass
+
+def prune_dir(disk_dir,prefix,max_bytes,group=None):
+    '''
+    delete the least recently used (modified, see touch) files in
+    disk_dir whose names start with prefix, until they take up at most
+    max_bytes; files with the same group(name) are deleted together,
+    and the most recent group is always kept
+    '''
+    groups = {}
+    for name in os.listdir(disk_dir):
+        if not name.startswith(prefix + '_') or '.tmp.' in name:
+            continue
+        path = os.path.join(disk_dir,name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entry = groups.setdefault(group(name) if group else name,[0,0,[]])
+        entry[0] = max([entry[0],st.st_mtime])
+        entry[1] += st.st_size
+        entry[2].append(path)
+    total = sum(size for _,size,_ in groups.values())
+    for _,size,paths in sorted(groups.values())[:-1]:
+        if total <= max_bytes:
+            break
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+
+class ArrayCache:
+    '''
+    tuples of arrays by key, least recently used dropped first once
+    max_bytes is exceeded (a tuple larger than max_bytes is not kept in
+    memory at all); if disk_dir is set, they are also saved
+    there (one .npy file per array), and looked for there before being
+    computed again; there too, the least recently used are deleted
+    once they take up more than disk_bytes (if that is set)
+    '''
+    def __init__(self,max_bytes,disk_dir=None,prefix='cache',disk_bytes=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self.prefix = prefix
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.disk_hits = self.misses = 0
+
+    def path(self,key,i):
+        name = hashlib.sha1(repr(key).encode('ascii')).hexdigest()
+        return os.path.join(self.disk_dir,
+                            '%s_%s_%d.npy' % (self.prefix,name,i))
+
+    def load(self,key):
+        '''the arrays for key from disk, memory-mapped; None if not there'''
+        if not self.disk_dir or not os.path.exists(self.path(key,0)):
+            return None
+        arrs = []
+        while os.path.exists(self.path(key,len(arrs))):
+            path = self.path(key,len(arrs))
+            touch(path)
+            arrs.append(np.load(path,mmap_mode='r'))
+        return tuple(arrs)
+
+    def save(self,key,arrs):
+        '''write to .npy files (atomically, via temporary files)'''
+        if not os.path.isdir(self.disk_dir):
+            os.makedirs(self.disk_dir)
+        for i,arr in enumerate(arrs):
+            path = self.path(key,i)
+            tmp = path[:-len('.npy')] + '.tmp.npy'
+            np.save(tmp,arr)
+            os.rename(tmp,path)
+        if self.disk_bytes is not None:
+            ## the arrays of one key go together: name_0.npy, name_1.npy...
+            prune_dir(self.disk_dir,self.prefix,self.disk_bytes,
+                      lambda name: name.rsplit('_',1)[0])
+
+    def get(self,key,compute):
+        '''
+        the tuple of arrays for key, from memory, disk, or else
+        compute() (which returns an array or a tuple of them)
+        '''
+        if key in self.entries:
+            self.hits += 1
+            arrs = self.entries.pop(key)
+        else:
+            arrs = self.load(key)
+            if arrs is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                arrs = compute()
+                if not isinstance(arrs,tuple):
+                    arrs = (arrs,)
+                arrs = tuple(freeze(np.asarray(arr)) for arr in arrs)
+                if self.disk_dir:
+                    self.save(key,arrs)
+            nbytes = sum(arr.nbytes for arr in arrs)
+            if nbytes > self.max_bytes:
+                ## too big to keep, even alone (the disk may have it)
+                return arrs
+            self.nbytes += nbytes
+        self.entries[key] = arrs
+        ## drop least recently used
+        while self.nbytes > self.max_bytes:
+            _,old = self.entries.popitem(last=False)
+            self.nbytes -= sum(arr.nbytes for arr in old)
+        return arrs
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return dict(hits=self.hits,disk_hits=self.disk_hits,
+                    misses=self.misses,entries=len(self.entries),
+                    nbytes=self.nbytes)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# Headless batch version of Quick Enhance: no GIMP (and no GUI) needed
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License at http://www.gnu.org/licenses for
+# more details.
+
+from __future__ import print_function, division
+
+DESCRIPTION='''
+Runs Quick Enhance (Cheap HDR, then sharpen, then stretch) over many
+image files, using the numpy engine in npprocess.py instead of the GIMP.
+Images are fanned out over a pool of worker processes, each result is
+written to the output directory as soon as it is done, and a manifest
+records the status and timing of every image.  Results keep their
+paths relative to the directory that holds all the inputs, so files of
+the same name in different directories do not overwrite each other;
+if an output would overwrite an input, nothing is done at all.  The
+blur cache is off, since no image is blurred twice.
+
+Needs numpy, and Pillow for reading and writing the image files.
+'''
+
+import argparse
+import csv
+import glob
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+import numpy as np
+import fastblur
+import npprocess
+import tiles
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+IMAGE_EXTENSIONS = ('.jpg','.jpeg','.png','.tif','.tiff','.bmp')
+MANIFEST_FIELDS = ['source','output','status','seconds','width','height',
+                   'error']
+
+def find_images(sources):
+    '''
+    expand directories and globs into a sorted list of image files
+    (each file once, however many sources name it)
+    '''
+    files = []
+    for src in sources:
+        if os.path.isdir(src):
+            names = sorted(os.listdir(src))
+            files += [os.path.join(src,name) for name in names
+                      if name.lower().endswith(IMAGE_EXTENSIONS)]
+        else:
+            files += sorted(glob.glob(src)) or [src]
+    seen = set()
+    unique = []
+    for path in files:
+        if os.path.realpath(path) not in seen:
+            seen.add(os.path.realpath(path))
+            unique.append(path)
+    return unique
+
+def common_dir(files):
+    '''the deepest directory that holds all of files'''
+    dirs = [os.path.dirname(os.path.abspath(path)).split(os.sep)
+            for path in files]
+    common = dirs[0]
+    for parts in dirs[1:]:
+        n = 0
+        while n < min([len(common),len(parts)]) and common[n] == parts[n]:
+            n += 1
+        common = common[:n]
+    return os.sep.join(common) or os.sep
+
+def output_paths(files,outdir,ext=None):
+    '''
+    where the enhanced versions of files are written: at their paths
+    relative to common_dir(files), within outdir.  A path that would
+    still be used twice (eg, x.jpg and x.png, with ext) gets -2, -3...
+    '''
+    root = common_dir(files) if files else ''
+    used = set()
+    out = []
+    for src in files:
+        base,src_ext = os.path.splitext(os.path.relpath(os.path.abspath(src),
+                                                        root))
+        dst = os.path.join(outdir,base + (ext or src_ext))
+        n = 1
+        while os.path.normcase(dst) in used:
+            n += 1
+            dst = os.path.join(outdir,'%s-%d%s' % (base,n,ext or src_ext))
+        used.add(os.path.normcase(dst))
+        out.append(dst)
+    return out
+
+def overwritten(files,outputs):
+    '''the outputs that are (or, through links, resolve to) input files'''
+    inputs = set(os.path.realpath(path) for path in files)
+    return [dst for dst in outputs if os.path.realpath(dst) in inputs]
+
+def read_image(path):
+    '''image file to (uint8 array, has_alpha)'''
+    im = Image.open(path)
+    if im.mode not in ('RGB','RGBA','L','LA'):
+        im = im.convert('RGBA' if 'A' in im.getbands() else 'RGB')
+    arr = np.asarray(im,dtype=np.uint8)
+    if arr.ndim == 2:
+        arr = arr[...,None]
+    return arr,im.mode.endswith('A')
+
+def write_image(path,arr,quality=95):
+    '''(h,w,channels) array, rounded and clipped to uint8, to an image file'''
+    arr = np.clip(np.rint(arr),0,255).astype(np.uint8)
+    if arr.shape[-1] == 1:
+        arr = arr[...,0]
+    im = Image.fromarray(arr)
+    if path.lower().endswith(('.jpg','.jpeg')):
+        im = im.convert('L' if im.mode in ('L','LA') else 'RGB')
+        im.save(path,quality=quality)
+    else:
+        im.save(path)
+
+def enhance_file(job):
+    '''worker: quick-enhance one file; returns its manifest row'''
+    src,dst,params = job
+    row = dict(source=src,output=dst,status='ok',seconds=0,
+               width='',height='',error='')
+    t0 = time.time()
+    try:
+        arr,has_alpha = read_image(src)
+        row['height'],row['width'] = arr.shape[:2]
+        sigma = fastblur.wide_blur_sigma(params['r_hdr'])
+        result = npprocess.quick_enhance(arr,sigma,params['s_hdr'],
+                                         params['f_hdr']/100,
+                                         params['r_sharp'],params['s_l_mode'],
+                                         params['f_stretch']/100,
+                                         has_alpha,params['fast'])[0]
+        write_image(dst,result,params['quality'])
+    except Exception as e:
+        row['status'] = 'error'
+        row['error'] = '%s: %s' % (type(e).__name__,e)
+        traceback.print_exc()
+    row['seconds'] = '%.3f' % (time.time()-t0)
+    return row
+
+def init_worker(threads):
+    '''worker process setup: tile threads, and no blur cache'''
+    tiles.set_workers(threads)
+    ## each image is blurred once, so caching would only cost a hash
+    ## of every image, and memory
+    fastblur.CACHE_BYTES = 0
+    fastblur.CACHE_DIR = None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=DESCRIPTION,
+                    formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sources',nargs='+',
+                        help='image files, directories, or glob patterns')
+    parser.add_argument('-o','--outdir',required=True,
+                        help='directory for the enhanced images')
+    ## same parameters, and defaults, as quickenhance.py registers
+    parser.add_argument('--r_hdr',type=float,default=750,help='HDR Radius')
+    parser.add_argument('--s_hdr',type=int,default=50,help='HDR Spread')
+    parser.add_argument('--f_hdr',type=float,default=50,help='HDR factor')
+    parser.add_argument('--r_sharp',type=float,default=9,
+                        help='Unsharp Radius')
+    parser.add_argument('--s_l_mode',default='darken',
+                        choices=sorted(npprocess.BLEND_MODES),
+                        help='Sharpen Layer Mode')
+    parser.add_argument('--f_stretch',type=float,default=50,
+                        help='Stretch factor')
+    parser.add_argument('--fast',action='store_true',
+                        help='use the pyramid blur for the HDR step')
+    parser.add_argument('--format',dest='ext',default=None,
+                        help='output extension, eg .png (default: as input)')
+    parser.add_argument('--quality',type=int,default=95,
+                        help='JPEG quality of the output')
+    parser.add_argument('-j','--workers',type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='worker processes (default: number of cores)')
+    parser.add_argument('--threads',type=int,default=1,
+                        help='tile threads within each worker process')
+    parser.add_argument('--manifest',default=None,
+                        help='manifest file (default: OUTDIR/manifest.csv)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if Image is None:
+        print('batchenhance needs Pillow to read and write images',
+              file=sys.stderr)
+        return 2
+    params = dict(r_hdr=args.r_hdr,s_hdr=args.s_hdr,f_hdr=args.f_hdr,
+                  r_sharp=args.r_sharp,s_l_mode=args.s_l_mode,
+                  f_stretch=args.f_stretch,fast=args.fast,
+                  quality=args.quality)
+    files = find_images(args.sources)
+    outputs = output_paths(files,args.outdir,args.ext)
+    manifest = args.manifest or os.path.join(args.outdir,'manifest.csv')
+    clobbered = overwritten(files,outputs + [manifest])
+    if clobbered:
+        print('batchenhance would overwrite input files (choose another '
+              'output directory):',*clobbered,sep='\n  ',file=sys.stderr)
+        return 2
+    for path in outputs + [manifest]:
+        if not os.path.isdir(os.path.dirname(path) or '.'):
+            os.makedirs(os.path.dirname(path))
+    jobs = [(src,dst,params) for src,dst in zip(files,outputs)]
+
+    nfail = 0
+    t0 = time.time()
+    pool = multiprocessing.Pool(max([1,min([args.workers,len(jobs)])]),
+                                init_worker,(args.threads,))
+    try:
+        with open(manifest,'w') as fp:
+            writer = csv.DictWriter(fp,MANIFEST_FIELDS)
+            writer.writeheader()
+            ## write rows as they finish, so a long batch can be watched
+            for row in pool.imap_unordered(enhance_file,jobs):
+                writer.writerow(row)
+                fp.flush()
+                nfail += row['status'] != 'ok'
+                print(row['status'],row['seconds'],row['source'])
+    finally:
+        pool.close()
+        pool.join()
+    print('%d images, %d failed, %.1f s' % (len(jobs),nfail,time.time()-t0))
+    return 1 if nfail else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
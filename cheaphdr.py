@@ -11,30 +11,10 @@
 # GNU General Public License at http://www.gnu.org/licenses for
 # more details.
 
-## Note: CheapHDR is applied to the current layer
-## May prefer to have it apply to the current visible image
 
 from gimpfu import *
-import process
+import procedures
 
-def cheap_hdr(img,layer,radius,spread,opacity):
-    with process.UndoContext(img):
-        process.cheap_hdr(img,layer,radius,spread,opacity)
-
-
-process.pfreg(cheap_hdr,
-              [
-                  (PF_IMAGE, "image", "Input image", None),
-                  (PF_DRAWABLE, "drawable", "Input drawable", None),
-                  (PF_SLIDER, "radius", "Radius", 500, (0, 1500, 10)),
-                  (PF_SLIDER, "spread", "Spread", 50, (0, 250, 10)),
-                  (PF_SLIDER, "opacity", "Factor", 50, (0, 100, 5)),
-              ],
-              name="Cheap HDR",
-              description="Reduce global contrast while keeping local contrast",
-              author="theilr",
-              year=2022,
-              menu="<Image>/Filters/theilr",
-)
+procedures.register("cheap_hdr")
 
 main()
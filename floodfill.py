@@ -0,0 +1,175 @@
+'''Flood fill and connected-component labeling of numpy arrays'''
+
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License at http://www.gnu.org/licenses for
+# more details.
+
+## Array versions of what fuzzy select (gimp_image_select_contiguous_color)
+## does, for jagged_border.  Pixels are 4-connected, as in the GIMP.
+## Labeling is by scan lines: each horizontal run of pixels is a node,
+## runs in neighbouring rows that overlap are joined, and the runs are
+## merged into components by a vectorized union-find, so there is no
+## python loop over pixels (or rows).
+
+from __future__ import print_function, division
+import numpy as np
+
+def union_find(n,a,b):
+    '''
+    root of each of the nodes 0..n, once the nodes are joined by the
+    edges a[i]-b[i]; the root of a component is its smallest node
+    '''
+    parent = np.arange(n+1,dtype=np.int32)
+    while len(a):
+        ra,rb = parent[a],parent[b]
+        lo,hi = np.minimum(ra,rb),np.maximum(ra,rb)
+        joined = lo != hi
+        if not joined.any():
+            break
+        ## hook each root to the smallest root it touches...
+        np.minimum.at(parent,hi[joined],lo[joined])
+        ## ...then point every node straight at its root
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand,parent):
+                break
+            parent = grand
+        ## edges inside a component will never join anything again
+        a,b = a[joined],b[joined]
+    return parent
+
+def label(mask,key=None):
+    '''
+    connected components of the True pixels of a 2-d mask; returns
+    (labels, count).  Pixels of a component share a label, which is
+    positive (but not consecutive); pixels off the mask are 0.  If key
+    is given, neighbours are only connected if their keys are equal.
+    '''
+    mask = np.asarray(mask,dtype=bool)
+    across = mask[:,1:] & mask[:,:-1]
+    down = mask[:-1] & mask[1:]
+    if key is not None:
+        across &= key[:,1:] == key[:,:-1]
+        down &= key[:-1] == key[1:]
+    start = mask.copy()
+    start[:,1:] &= ~across
+    runs = np.cumsum(start.ravel(),dtype=np.int32).reshape(mask.shape)
+    runs[~mask] = 0
+    n = int(runs.max()) if runs.size else 0
+    ## one edge at the start of each stretch where two runs overlap
+    first = down.copy()
+    first[:,1:] &= ~(down[:,:-1] & across[:-1] & across[1:])
+    root = union_find(n,runs[:-1][first],runs[1:][first])
+    return root[runs],int(np.count_nonzero(root[1:] == np.arange(1,n+1)))
+
+def color_distance(arr,ref):
+    '''
+    largest difference over the channels of arr from the color ref,
+    as fuzzy select measures it (selection criterion "composite")
+    '''
+    arr = arr if arr.ndim == 3 else arr[...,None]
+    dist = np.zeros(arr.shape[:2],dtype=np.float32)
+    for c in range(arr.shape[2]):
+        np.maximum(dist,np.abs(arr[...,c].astype(np.float32) - ref[c]),
+                   out=dist)
+    return dist
+
+def seed_colors(arr,seeds):
+    '''[(color, seeds of that color)]: seeds of one color flood together'''
+    by_color = {}
+    for x,y in seeds:
+        by_color.setdefault(tuple(arr[y,x]),[]).append((x,y))
+    return [(np.asarray(color,dtype=np.float32),group)
+            for color,group in sorted(by_color.items())]
+
+def flood(arr,seeds,threshold):
+    '''
+    pixels selected by fuzzy select from each (x,y) in seeds, added
+    together: those within threshold (0-255) of the seed's color and
+    connected to the seed.  No antialiasing: the mask is boolean.
+    '''
+    arr = np.asarray(arr)
+    arr = arr if arr.ndim == 3 else arr[...,None]
+    out = np.zeros(arr.shape[:2],dtype=bool)
+    for color,group in seed_colors(arr,seeds):
+        close = color_distance(arr,color) <= threshold
+        labels,_ = label(close)
+        hits = [labels[y,x] for x,y in group if labels[y,x]]
+        out |= np.isin(labels,hits)
+    return out
+
+def fill_islands(mask,x,y,threshold=0):
+    '''
+    mask with everything that is not connected to pixel (x,y) turned on:
+    the inverse of a fuzzy select from (x,y) on the black and white mask
+    '''
+    bw = np.where(mask,np.uint8(255),np.uint8(0))
+    return mask | ~flood(bw,[(x,y)],threshold)
+
+######################################
+## Join levels: floods at every threshold
+
+def join_levels(cost,seeds):
+    '''
+    the smallest threshold t at which each pixel is connected to one of
+    the seeds through pixels of cost <= t (the minimax path cost), for
+    a uint8 cost plane; so join_levels(cost,seeds) <= t is the flood of
+    cost <= t from the seeds.  Found by bisection on all pixels at
+    once: eight labelings, whatever the number of levels in use.
+    '''
+    cost = np.asarray(cost,dtype=np.uint8)
+    ## each pixel's level is known to be in lo..hi
+    lo = np.zeros(cost.shape,dtype=np.int16)
+    hi = np.full(cost.shape,255,dtype=np.int16)
+    for _ in range(8):
+        mid = (lo+hi)//2
+        low_cost = cost <= mid
+        ## joined at mid: a component of pixels with the same lo..hi,
+        ## all of cost <= mid, that touches a seed, or a pixel whose
+        ## level is below lo (so already joined)
+        labels,_ = label(low_cost,key=lo)
+        touch = np.zeros(cost.shape,dtype=bool)
+        touch[1:] |= lo[:-1] < lo[1:]
+        touch[:-1] |= lo[1:] < lo[:-1]
+        touch[:,1:] |= lo[:,:-1] < lo[:,1:]
+        touch[:,:-1] |= lo[:,1:] < lo[:,:-1]
+        for x,y in seeds:
+            touch[y,x] = True
+        touch &= low_cost
+        joined = np.zeros(int(labels.max())+1,dtype=bool)
+        joined[labels[touch]] = True
+        joined = joined[labels]
+        hi = np.where(joined,mid,hi)
+        lo = np.where(joined,lo,mid+1)
+    return lo.astype(np.uint8)
+
+def flood_levels(arr,seeds):
+    '''
+    join levels of fuzzy select from the seeds: flood_levels(arr,seeds)
+    <= threshold is flood(arr,seeds,threshold), for any threshold
+    '''
+    arr = np.asarray(arr)
+    arr = arr if arr.ndim == 3 else arr[...,None]
+    levels = np.full(arr.shape[:2],255,dtype=np.uint8)
+    for color,group in seed_colors(arr,seeds):
+        dist = color_distance(arr,color)
+        cost = np.minimum(np.ceil(dist),255).astype(np.uint8)
+        np.minimum(levels,join_levels(cost,group),out=levels)
+    return levels
+
+def island_levels(levels,x,y):
+    '''
+    from join levels, the levels with islands filled in from (x,y):
+    island_levels(levels,x,y) <= t is fill_islands(levels <= t,x,y,t)
+    for any threshold t < 255.  The level of a pixel is the highest
+    t at which it can still be reached from (x,y) without crossing
+    a pixel joined at t (the maximin path level).
+    '''
+    return 255 - join_levels(255 - levels,[(x,y)])
@@ -0,0 +1,177 @@
+'''Per-channel histograms and statistics of images, kept per image state'''
+
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License at http://www.gnu.org/licenses for
+# more details.
+
+## The histograms of all the channels are made in one pass over the
+## pixels, a band of rows at a time (so each band is still in cache
+## when its next channel is counted).  Percentiles,
+## extremes, and levels-stretch bounds are then read off the histograms,
+## without going back to the pixels.
+##
+## Statistics are kept by image state: a key (made by the caller, see
+## process.visible_state) for what an image looks like at some point.
+## A step that has just made that state, and so has its pixels at hand
+## (cheap_hdr, sharpen), feeds them in with feed(); a later step asks
+## for them, or for their statistics, by the same key, and does not
+## have to copy and read the image again.  Fed pixels are only worked
+## out (and counted) if they are asked for.  As with the blur cache,
+## this only lasts as long as the plug-in call.
+
+from __future__ import print_function, division
+from collections import OrderedDict
+import numpy as np
+
+## image states kept (each may hold a copy of an image)
+MAX_STATES = 2
+
+## rows counted at a time
+BAND_ROWS = 64
+
+def channel_values(chan):
+    '''
+    integer values of a channel: uint8 and uint16 as they are,
+    anything else rounded and clipped to 0-255
+    '''
+    if chan.dtype in (np.uint8,np.uint16):
+        return chan
+    return np.clip(np.rint(chan),0,255).astype(np.uint8)
+
+def histograms(arr,has_alpha=False,sample=1):
+    '''
+    (channels,bins) counts of each color channel of an (h,w,channels)
+    array: 256 bins, or 65536 for uint16.  With sample > 1, only every
+    sample'th pixel of every sample'th row is counted.
+    '''
+    if arr.ndim == 2:
+        arr = arr[...,None]
+    if sample > 1:
+        arr = arr[::sample,::sample]
+    ncolor = arr.shape[-1] - bool(has_alpha)
+    bins = 65536 if arr.dtype == np.uint16 else 256
+    counts = np.zeros((ncolor,bins),dtype=np.int64)
+    for lo in range(0,arr.shape[0],BAND_ROWS):
+        band = arr[lo:lo+BAND_ROWS]
+        for c in range(ncolor):
+            counts[c] += np.bincount(channel_values(band[...,c]).ravel(),
+                                     minlength=bins)
+    return counts
+
+def levels_stretch_bounds(hist,fraction=0.006):
+    '''
+    low and high input levels from a 256-bin histogram, found the way
+    gimp_drawable_levels_stretch does: clip about 0.6% at either end
+    '''
+    count = hist.sum()
+    if not count:
+        return 0,len(hist)-1
+    def first_crossing(cum):
+        dist = np.abs(cum/count - fraction)
+        near = dist[:-1] < dist[1:]
+        return int(np.argmax(near)) if near.any() else None
+    top = len(hist)-1
+    low = first_crossing(np.cumsum(hist))
+    high = first_crossing(np.cumsum(hist[::-1]))
+    low = 0 if low is None else low+1
+    high = top if high is None else top-1-high
+    return low,max(high,low+1)
+
+class ImageStats:
+    '''statistics of each color channel of an array, from its histograms'''
+    def __init__(self,arr,has_alpha=False,sample=1):
+        self.hist = histograms(arr,has_alpha,sample)
+        self.count = int(self.hist[0].sum()) if len(self.hist) else 0
+
+    def minimum(self):
+        '''smallest value in each channel (0 if there are no pixels)'''
+        return [int(np.argmax(h > 0)) for h in self.hist]
+
+    def maximum(self):
+        '''largest value in each channel'''
+        top = self.hist.shape[1]-1
+        return [top - int(np.argmax(h[::-1] > 0)) for h in self.hist]
+
+    def percentile(self,q):
+        '''the smallest value in each channel with q percent at or below it'''
+        cum = np.cumsum(self.hist,axis=1)
+        need = q/100*self.count
+        return [int(np.searchsorted(c,max([need,1]))) if self.count else 0
+                for c in cum]
+
+    def mean(self):
+        vals = np.arange(self.hist.shape[1])
+        return [float(h.dot(vals))/max([self.count,1]) for h in self.hist]
+
+    def stretch_bounds(self,fraction=0.006):
+        '''(low,high) of each channel, as levels_stretch_bounds'''
+        return [levels_stretch_bounds(h,fraction) for h in self.hist]
+
+    def stretch_luts(self,fraction=0.006):
+        '''
+        (channels,bins) float32 lookup tables that stretch each channel
+        from its (low,high) to the full range
+        '''
+        top = self.hist.shape[1]-1
+        vals = np.arange(top+1,dtype=np.float32)
+        return np.array([np.clip((vals-low)*top/(high-low),0,top)
+                         for low,high in self.stretch_bounds(fraction)],
+                        dtype=np.float32)
+
+def apply_luts(arr,luts):
+    '''
+    arr with its first len(luts) channels (the color) each looked up in
+    its own table, and any others (alpha) left alone; returns float32
+    '''
+    out = np.array(arr,dtype=np.float32)
+    for c,lut in enumerate(luts):
+        out[...,c] = lut[channel_values(np.asarray(arr[...,c]))]
+    return out
+
+############################
+## Statistics by image state
+
+STATES = OrderedDict()
+
+def feed(state,compute,has_alpha=False):
+    '''
+    record that the pixels of an image in state are compute() (an
+    (h,w,channels) array), to be called only if they are asked for
+    '''
+    STATES.pop(state,None)
+    STATES[state] = dict(compute=compute,has_alpha=has_alpha,stats={})
+    while len(STATES) > MAX_STATES:
+        STATES.popitem(last=False)
+
+def pixels(state):
+    '''the pixels fed for state, or None if there are none'''
+    entry = STATES.get(state)
+    if entry is None:
+        return None
+    if 'pixels' not in entry:
+        entry['pixels'] = entry.pop('compute')()
+    return entry['pixels']
+
+def stats(state,sample=1):
+    '''the ImageStats of the pixels fed for state, or None'''
+    arr = pixels(state)
+    if arr is None:
+        return None
+    entry = STATES[state]
+    if sample not in entry['stats']:
+        entry['stats'][sample] = ImageStats(arr,entry['has_alpha'],sample)
+    return entry['stats'][sample]
+
+def forget(state=None):
+    '''drop what was fed for state (or for every state)'''
+    if state is None:
+        STATES.clear()
+    else:
+        STATES.pop(state,None)
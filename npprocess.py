@@ -0,0 +1,653 @@
+'''NumPy counterparts of the image processing functions in process.py'''
+
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License at http://www.gnu.org/licenses for
+# more details.
+
+## These work on (h,w,channels) uint8 arrays, as read from a drawable,
+## and return arrays of the same shape, ready to be written back.
+## Like fastblur, nothing in here knows about the GIMP.  Per-pixel and
+## small-neighbourhood steps are run tile by tile on threads (tiles.py).
+
+from __future__ import print_function, division
+import math
+import os
+from collections import OrderedDict
+import numpy as np
+import arraycache
+import fastblur
+import floodfill
+import imagestats
+import tiles
+
+## Rec. 709 weights, which the GIMP uses for DESATURATE_LUMINANCE
+LUMA_WEIGHTS = (0.2126, 0.7152, 0.0722)
+
+## jagged_border threshold maps are kept for the last few images, so a
+## threshold sweep does the labeling once.  Each GIMP plug-in call is
+## a separate process, so to keep them from one call to the next, set
+## this to a directory, eg os.path.expanduser('~/.cache/gimp-frastructure')
+BORDER_MAP_DIR = None
+BORDER_MAPS = 4
+## the least recently used maps there are deleted once they take up
+## more than this (a full-size map is a few bytes per pixel)
+BORDER_MAP_DISK_BYTES = 2*2**30
+
+#############################
+## Color and channel helpers
+
+def srgb_to_linear(arr):
+    '''
+    sRGB-encoded values (0-255) to linear light in [0,1], as float32;
+    uint8 through a lookup table, anything else (clipped) by the formula
+    '''
+    if arr.dtype == np.uint8:
+        v = np.arange(256,dtype=np.float64)/255
+        lut = np.where(v <= 0.04045, v/12.92, ((v+0.055)/1.055)**2.4)
+        return lut.astype(np.float32)[arr]
+    v = np.clip(np.asarray(arr,dtype=np.float32)/255,0,1)
+    return np.where(v <= 0.04045, v/12.92,
+                    ((v+0.055)/1.055)**2.4).astype(np.float32)
+
+def linear_to_srgb(lin):
+    '''linear light in [0,1] to sRGB-encoded values in [0,255], as float32'''
+    lin = np.clip(lin,0,1)
+    srgb = np.where(lin <= 0.0031308, 12.92*lin,
+                    1.055*np.power(lin,1/2.4) - 0.055)
+    return (255*srgb).astype(np.float32)
+
+def split_alpha(arr,has_alpha):
+    '''(color, alpha) views of arr; alpha is None if there is none'''
+    if has_alpha:
+        return arr[...,:-1],arr[...,-1]
+    return arr,None
+
+def is_opaque(arr,has_alpha):
+    '''True if arr has no alpha, or its alpha is 255 everywhere'''
+    _,alpha = split_alpha(arr,has_alpha)
+    return alpha is None or alpha.min() == 255
+
+def luminance(arr,has_alpha=False):
+    '''linear-light luminance of an rgb(a) or gray(a) array, as a float32 plane'''
+    color,_ = split_alpha(arr,has_alpha)
+    if color.shape[-1] == 1:
+        return srgb_to_linear(color[...,0])
+    lum = np.zeros(arr.shape[:2],dtype=np.float32)
+    for c,wt in enumerate(LUMA_WEIGHTS):
+        lum += wt*srgb_to_linear(color[...,c])
+    return lum
+
+def gray_to_channels(gray,alpha,nchannels):
+    '''stack a gray plane (and alpha, if any) into nchannels channels'''
+    ncolor = nchannels - (alpha is not None)
+    planes = [gray]*ncolor + ([alpha] if alpha is not None else [])
+    return np.dstack(planes)
+
+#############################
+## Image processing functions
+
+def luminance_space(arr,has_alpha=False,fast=False):
+    '''
+    fastblur.ScaleSpace of the linear-light luminance plane of arr (with
+    alpha, if any and not all opaque, as a second plane)
+    '''
+    _,alpha = split_alpha(arr,has_alpha)
+    lum = tiles.map_tiles(lambda t: luminance(t,has_alpha),arr)
+    if alpha is None or alpha.min() == 255:
+        return fastblur.ScaleSpace(lum,fast=fast)
+    alpha_f = alpha.astype(np.float32)/255
+    return fastblur.ScaleSpace(np.dstack([lum,alpha_f]),True,fast)
+
+def blur_luminance(arr,sigma,has_alpha=False,fast=False,space=None):
+    '''
+    blurred linear-light luminance plane (and blurred alpha, or None);
+    with alpha the blur is premultiplied, as for the full-color blur.
+    The planes come (read-only) from the blur cache if arr was blurred
+    this way before; else from space, the luminance_space of arr, if
+    given (so other blurs of it can be had from the same stack).
+    '''
+    _,alpha = split_alpha(arr,has_alpha)
+    opaque = alpha is None or alpha.min() == 255
+    def compute():
+        level = (space or luminance_space(arr,has_alpha,fast)).level(sigma)
+        if opaque:
+            return level
+        return level[...,0],255*level[...,1]
+    key = lambda: (arraycache.checksum(arr),'luminance',float(sigma),
+                   bool(has_alpha),bool(fast),fastblur.blur_version(fast))
+    if opaque:
+        return fastblur.cached(key,compute),alpha
+    return fastblur.cached(key,compute)
+
+def blur_linear(arr,sigma,has_alpha=False,fast=False,inner=None):
+    '''
+    fastblur.blur of an sRGB-encoded array, done in linear light, as the
+    GIMP's Gaussian blur does it; returns sRGB-encoded float32.  As with
+    fastblur.cached_blur, the result comes from the blur cache if arr
+    was blurred this way before.
+    '''
+    def compute():
+        color,alpha = split_alpha(arr,has_alpha)
+        lin = tiles.map_tiles(lambda t: 255*srgb_to_linear(t),color)
+        if alpha is not None:
+            lin = np.dstack([lin,alpha])
+        out = fastblur.blur(lin,sigma,has_alpha,fast,inner)
+        del lin
+        ncolor = color.shape[-1]
+        out[...,:ncolor] = tiles.map_tiles(lambda t: linear_to_srgb(t/255),
+                                           out[...,:ncolor])
+        return out
+    return fastblur.cached(lambda: (arraycache.checksum(arr),'linear',
+                                    float(sigma),bool(has_alpha),
+                                    fastblur.blur_version(fast),
+                                    None if fast else inner),compute)
+
+def cheap_hdr_overlay(arr,sigma,has_alpha=False,fast=False,spread_by=0,
+                      seed=0):
+    '''
+    the cheap_hdr overlay, computed on one luminance plane:
+    blur, then desaturate (luminance), then invert, then (if spread_by)
+    spread; the spread moves the gray plane and alpha together
+    '''
+    lum,alpha = blur_luminance(arr,sigma,has_alpha,fast)
+    gray = tiles.map_tiles(lambda t: 255 - linear_to_srgb(t),lum)
+    if spread_by and alpha is None:
+        gray = spread(gray,spread_by,seed)
+    elif spread_by:
+        both = spread(np.dstack([gray,alpha]),spread_by,seed)
+        gray,alpha = both[...,0],both[...,1]
+    return gray_to_channels(gray,alpha,arr.shape[-1])
+
+def spread(arr,amount,seed=0):
+    '''
+    like plug-in-spread: each pixel is taken from a random pixel at most
+    amount away (x and y), with edges clamped.  Unlike the plug-in, it
+    is reproducible: the displacements are drawn tile by tile from
+    generators seeded with (seed, tile corner), so the result depends
+    on seed (None for a fresh one), not on how the tiles are threaded.
+    '''
+    amount = int(amount)
+    if not amount:
+        return arr
+    h,w = arr.shape[:2]
+    if seed is None:
+        seed = np.random.randint(2**31)
+    def kernel(y0,y1,x0,x1):
+        rng = np.random.RandomState([seed,y0,x0])
+        shape = (y1-y0,x1-x0)
+        xdist = rng.randint(-amount,amount+1,shape)
+        ydist = rng.randint(-amount,amount+1,shape)
+        angle = rng.uniform(-np.pi,np.pi,shape)
+        xi = np.floor(np.arange(x0,x1) + xdist*np.cos(angle)).astype(np.intp)
+        yi = np.floor(np.arange(y0,y1)[:,None] +
+                      ydist*np.sin(angle)).astype(np.intp)
+        return arr[np.clip(yi,0,h-1),np.clip(xi,0,w-1)]
+    return tiles.fill_tiles(kernel,h,w)
+
+def mix_linear(base,top,opacity):
+    '''
+    top over base at opacity (a fraction), mixed in linear light, as the
+    GIMP 2.10 mixes a layer's opacity; sRGB-encoded in and out (float32)
+    '''
+    lin = srgb_to_linear(base)
+    lin += opacity*(srgb_to_linear(top) - lin)
+    return linear_to_srgb(lin)
+
+def overlay(base,top,opacity=1.):
+    '''Overlay layer mode, top over base; 0-255 values, top may be a plane'''
+    base = np.asarray(base,dtype=np.float32)/255
+    top = np.asarray(top,dtype=np.float32)/255
+    if top.ndim < base.ndim:
+        top = top[...,None]
+    comp = np.where(base <= 0.5, 2*base*top, 1 - 2*(1-base)*(1-top))
+    return 255*(base + opacity*(comp-base))
+
+def unsharp_mask(arr,radius,amount=0.5):
+    '''
+    like plug-in-unsharp-mask (with zero threshold), and like it, in
+    linear light; arr is sRGB-encoded, and so is the float32 result
+    '''
+    def kernel(tile):
+        space = fastblur.ScaleSpace(srgb_to_linear(tile))
+        return linear_to_srgb(space.level(0) + amount*space.detail(radius))
+    return tiles.map_tiles(kernel,arr,halo=fastblur.blur_reach(radius))
+
+def sharpen(arr,radius,has_alpha=False,amount=0.5):
+    '''unsharp mask of the color channels; alpha is left alone'''
+    color,alpha = split_alpha(arr,has_alpha)
+    sharp = unsharp_mask(color,radius,amount)
+    return sharp if alpha is None else np.dstack([sharp,alpha])
+
+## numpy equivalents of the layer modes that sharpen offers
+BLEND_MODES = {
+    'normal': lambda base,top: top,
+    'darken': np.minimum,
+    'lighten': np.maximum,
+}
+
+def levels_stretch(arr,has_alpha=False,stats=None):
+    '''
+    per-channel levels stretch of the color channels, with the bounds
+    from stats (an imagestats.ImageStats of arr, made if not given), as
+    one lookup table per channel; returns float32
+    '''
+    stats = stats or imagestats.ImageStats(arr,has_alpha)
+    return imagestats.apply_luts(arr,stats.stretch_luts())
+
+def composite(arr,top,mode,opacity=1.,has_alpha=False):
+    '''
+    a layer top (0-255 values; only its first channel, for overlay) in
+    mode ('overlay' or a key of BLEND_MODES) at opacity (a fraction)
+    over arr, mixed on the sRGB values; alpha is taken from arr.  The
+    GIMP 2.10 mixes in linear light by default, so this is what it shows
+    only in some cases (see process.composite_matches).
+    '''
+    color,alpha = split_alpha(arr,has_alpha)
+    if mode == 'overlay':
+        out = overlay(color,top[...,0],opacity)
+    else:
+        color = color.astype(np.float32)
+        top = split_alpha(top,has_alpha)[0]
+        out = color + opacity*(BLEND_MODES[mode](color,top)-color)
+    out = np.clip(out,0,255)
+    return out if alpha is None else np.dstack([out,alpha])
+
+def quick_enhance(arr,sigma_hdr,s_hdr,f_hdr,r_sharp,s_l_mode,f_stretch,
+                  has_alpha=False,fast=False,stack=False):
+    '''
+    cheap_hdr, sharpen, and stretch in one pipeline, from one read of arr.
+    Opacities are fractions, s_l_mode is a key of BLEND_MODES; they are
+    mixed in linear light, as the GIMP mixes the layers' opacities.
+    Returns [result], or if stack, the arrays for the three layers that
+    the step-by-step version would make: [overlay, sharpened, last],
+    where last is the stretched image (or the result, if no stretch).
+    '''
+    color,alpha = split_alpha(arr,has_alpha)
+    hdr = cheap_hdr_overlay(arr,sigma_hdr,has_alpha,fast,s_hdr)
+    img = mix_linear(color,overlay(color,hdr[...,0]),f_hdr)
+    if not stack:
+        del hdr
+    sharp = unsharp_mask(img,r_sharp) if r_sharp else img
+    img = BLEND_MODES[s_l_mode](img,sharp)
+    if not stack:
+        del sharp
+    last = img = np.clip(img,0,255)
+    if alpha is not None:
+        img = np.dstack([img,alpha])
+    if f_stretch:
+        last = levels_stretch(img,has_alpha)
+        img = mix_linear(split_alpha(img,has_alpha)[0],
+                         split_alpha(last,has_alpha)[0],f_stretch)
+        if alpha is not None:
+            img = np.dstack([img,alpha])
+    if stack:
+        if alpha is not None:
+            sharp = np.dstack([sharp,alpha])
+        return [hdr,sharp,last if f_stretch else img]
+    return [img]
+
+def ellipse_kernel(y0,y1,x0,x1,inside,outside):
+    '''
+    tile kernel (for tiles.fill_tiles) of the ellipse that fills the
+    rectangle (y0,y1,x0,x1): value inside for pixel centers within it
+    '''
+    cy,cx = (y0+y1)/2,(x0+x1)/2
+    ry,rx = max([(y1-y0)/2,1]),max([(x1-x0)/2,1])
+    def kernel(ya,yb,xa,xb):
+        y = (np.arange(ya,yb,dtype=np.float32)+0.5 - cy)/ry
+        x = (np.arange(xa,xb,dtype=np.float32)+0.5 - cx)/rx
+        within = y[:,None]**2 + x[None,:]**2 < 1
+        return np.where(within,np.float32(inside),np.float32(outside))
+    return kernel
+
+def ellipse_inner_rect(y0,y1,x0,x1):
+    '''
+    (y0,y1,x0,x1) of a rectangle of whole pixels well inside the ellipse
+    that fills the rectangle (y0,y1,x0,x1)
+    '''
+    cy,cx = (y0+y1)/2,(x0+x1)/2
+    hy,hx = (y1-y0)/2/math.sqrt(2),(x1-x0)/2/math.sqrt(2)
+    ## a pixel of slack on each side, against rounding
+    return (int(math.ceil(cy-hy))+1,int(math.floor(cy+hy))-1,
+            int(math.ceil(cx-hx))+1,int(math.floor(cx+hx))-1)
+
+def vignette(h,w,lighten_corners,sigma,nchannels,has_alpha=False,spread_by=0,
+             seed=0):
+    '''
+    the vignette overlay: a mid-gray ellipse that fills the frame, on
+    white (or black) corners, blurred, and with noise spread by spread_by.
+    The blur is evaluated directly (fastblur.gauss_blur_ellipse), with no
+    ellipse to blur; against the box-cascade blur of the ellipse it is
+    within 2.5 gray levels (measured for radii of 50 to 2500), and that
+    difference is the box cascade's departure from a true Gaussian.
+    '''
+    ## in linear light, as the GIMP blurs
+    corner = 1. if lighten_corners else 0.
+    plane = fastblur.gauss_blur_ellipse(h,w,sigma,
+                                        srgb_to_linear(np.uint8(128)),corner)
+    plane = tiles.map_tiles(linear_to_srgb,plane)
+    plane = spread(plane,spread_by,seed)
+    alpha = np.full((h,w),255,dtype=np.float32) if has_alpha else None
+    return gray_to_channels(plane,alpha,nchannels)
+
+def lightness(arr,has_alpha=False):
+    '''HSL lightness, (max+min)/2, of the color channels, as a float32 plane'''
+    color,_ = split_alpha(arr,has_alpha)
+    color = np.asarray(color,dtype=np.float32)
+    return (color.max(axis=-1) + color.min(axis=-1))/2
+
+def border_frame(h,w,border_shape,border_size,sigma):
+    '''
+    the blurred frame of jagged_border: white outside the inner rectangle
+    (or ellipse), black inside.  border_shape is 1 for top and bottom
+    only, 2 for left and right only, 3 for an ellipse, and otherwise
+    both.  Top and bottom (or left and right) frames only vary along
+    one axis, so they are blurred as a single column (or row), which is
+    returned as an (h,1) (or (1,w)) array, to be broadcast.  The frame
+    depends only on its geometry, so it is cached by that (read-only).
+    '''
+    return fastblur.cached(lambda: ('frame',h,w,border_shape,border_size,
+                                    float(sigma),fastblur.NBOXES,'linear'),
+                           lambda: blur_frame(h,w,border_shape,border_size,
+                                              sigma))
+
+def blur_frame(h,w,border_shape,border_size,sigma):
+    '''
+    border_frame, computed.  Black and white are 0 and 1 in linear light
+    too, so the frame is made as 0 and 255, blurred as it is (which is
+    the blur in linear light, times 255), and then sRGB-encoded.
+    '''
+    if border_shape in (1,2):
+        n = h if border_shape == 1 else w
+        line = np.full((n,1),255,dtype=np.float32)
+        line[border_size:n-border_size] = 0
+        line = linear_to_srgb(fastblur.gauss_blur(line,sigma)/255)
+        return line if border_shape == 1 else line.T
+    xlo,xhi,ylo,yhi = border_size,w-border_size,border_size,h-border_size
+    if border_shape == 3:
+        inner = ellipse_inner_rect(ylo,yhi,xlo,xhi)
+        plane = tiles.fill_tiles(ellipse_kernel(ylo,yhi,xlo,xhi,0,255),h,w)
+    else:
+        inner = (ylo,yhi,xlo,xhi)
+        def kernel(y0,y1,x0,x1):
+            y = np.arange(y0,y1,dtype=np.float32)[:,None] + 0.5
+            x = np.arange(x0,x1,dtype=np.float32)[None,:] + 0.5
+            inside = (y > ylo) & (y < yhi) & (x > xlo) & (x < xhi)
+            return np.where(inside,np.float32(0),np.float32(255))
+        plane = tiles.fill_tiles(kernel,h,w)
+    ## only the frame changes, so only the frame is blurred
+    plane = fastblur.gauss_blur_roi(plane,sigma,inner)
+    return tiles.map_tiles(lambda t: linear_to_srgb(t/255),plane)
+
+def jagged_border_planes(arr,border_shape,border_white,border_size,
+                         one_pixel_border,has_alpha=False):
+    '''
+    the gray images that jagged_border fuzzy-selects from: the blurred
+    frame added (legacy addition, so clipped) to the lightness of arr,
+    which is inverted for a black border.  A rectangle (border_shape 0)
+    is top and bottom plus left and right, so it gives two images,
+    which share the one lightness plane.
+    '''
+    h,w = arr.shape[:2]
+    sigma = fastblur.wide_blur_sigma(2*border_size)
+    light = lightness(arr,has_alpha)
+    if not border_white:
+        light = 255 - light
+    if one_pixel_border:
+        light[[0,-1],:] = 255
+        light[:,[0,-1]] = 255
+    light = np.rint(light)
+    shapes = [1,2] if border_shape == 0 else [border_shape]
+    return [np.minimum(light + np.rint(border_frame(h,w,shape,border_size,
+                                                    sigma)),
+                       255).astype(np.uint8)
+            for shape in shapes]
+
+def jagged_border_mask(arr,border_shape,border_white,border_size,thresh,
+                       fill_islands,one_pixel_border,has_alpha=False):
+    '''
+    boolean mask of the jagged border: what fuzzy select (threshold thresh)
+    finds from the upper left and lower right corners of the gray image;
+    with fill_islands, all that is cut off from the center is added.
+    For a rectangle, the masks of its two images are combined.
+    '''
+    mask = None
+    for plane in jagged_border_planes(arr,border_shape,border_white,
+                                      border_size,one_pixel_border,has_alpha):
+        h,w = plane.shape
+        part = floodfill.flood(plane,[(0,0),(w-1,h-1)],thresh)
+        if fill_islands:
+            part = floodfill.fill_islands(part,w//2,h//2,thresh)
+        mask = part if mask is None else mask | part
+    return mask
+
+class BorderMap:
+    '''
+    jagged_border for every threshold at once: the border at threshold
+    t is levels <= t, levels being the join levels of the corners
+    (see floodfill.py); islands are the levels with islands filled in.
+    Both are lists, with one entry per image that jagged_border_planes
+    gives.  If path is set, the map is saved there whenever it grows.
+    '''
+    def __init__(self,levels,islands=None,path=None):
+        self.levels = levels
+        self.islands = islands
+        self.path = path
+        self.lowest = {}
+
+    def mask(self,thresh,fill_islands=False):
+        '''the border mask that jagged_border_mask would give'''
+        if fill_islands and self.islands is None:
+            h,w = self.levels[0].shape
+            self.islands = [floodfill.island_levels(levels,w//2,h//2)
+                            for levels in self.levels]
+            self.save()
+        ## the combined border is where any of the parts is
+        key = bool(fill_islands)
+        if key not in self.lowest:
+            parts = self.islands if fill_islands else self.levels
+            self.lowest[key] = np.minimum.reduce(parts)
+        return self.lowest[key] <= thresh
+
+    def save(self):
+        '''
+        write to path (atomically, via a temporary file), then prune the
+        maps in its directory to BORDER_MAP_DISK_BYTES
+        '''
+        if not self.path:
+            return
+        levels = dict(('levels_%d' % i,lev) for i,lev in enumerate(self.levels))
+        for i,lev in enumerate(self.islands or []):
+            levels['islands_%d' % i] = lev
+        disk_dir = os.path.dirname(self.path)
+        if not os.path.isdir(disk_dir):
+            os.makedirs(disk_dir)
+        tmp = self.path[:-len('.npz')] + '.tmp.npz'
+        np.savez(tmp,**levels)
+        os.rename(tmp,self.path)
+        arraycache.prune_dir(disk_dir,'border',BORDER_MAP_DISK_BYTES)
+
+    @classmethod
+    def load(cls,path):
+        arraycache.touch(path)
+        with np.load(path) as npz:
+            def parts(name):
+                names = sorted(f for f in npz.files if f.startswith(name))
+                return [npz[f] for f in names] or None
+            return cls(parts('levels_'),parts('islands_'),path)
+
+_border_maps = OrderedDict()
+
+def border_map(arr,border_shape,border_white,border_size,one_pixel_border,
+               has_alpha=False):
+    '''
+    the (cached) BorderMap of arr; the cache is keyed by a checksum
+    of the pixels and by the parameters of the jagged border
+    '''
+    key = (arraycache.checksum(arr),) + arr.shape + (
+        border_shape,int(bool(border_white)),border_size,
+        int(bool(one_pixel_border)))
+    path = None
+    if BORDER_MAP_DIR:
+        path = os.path.join(BORDER_MAP_DIR,
+                            'border_' + '_'.join(str(k) for k in key) + '.npz')
+    if key in _border_maps:
+        bmap = _border_maps.pop(key)
+    elif path and os.path.exists(path):
+        bmap = BorderMap.load(path)
+    else:
+        h,w = arr.shape[:2]
+        planes = jagged_border_planes(arr,border_shape,border_white,
+                                      border_size,one_pixel_border,has_alpha)
+        bmap = BorderMap([floodfill.flood_levels(plane,[(0,0),(w-1,h-1)])
+                          for plane in planes],path=path)
+        bmap.save()
+    _border_maps[key] = bmap
+    while len(_border_maps) > BORDER_MAPS:
+        _border_maps.popitem(last=False)
+    return bmap
+
+def border_layer(mask,border_white,nchannels,has_alpha=False):
+    '''
+    the Border layer from a border mask: border white and interior black
+    (for Addition mode), or the other way around (for Multiply mode)
+    '''
+    on = mask if border_white else ~mask
+    gray = np.where(on,np.float32(255),np.float32(0))
+    alpha = np.full(mask.shape,255,dtype=np.float32) if has_alpha else None
+    return gray_to_channels(gray,alpha,nchannels)
+
+def reflections(arr,n_horiz,n_vert,do_flip=True,hflip=False,vflip=False):
+    '''
+    arr tiled n_horiz across and n_vert down, into one new array; with
+    do_flip, every other tile is mirrored, so that neighbouring tiles
+    are reflections of each other.  hflip and vflip flip the upper-left
+    tile first (and so all the rest).  The tiles are written straight
+    from flipped views of arr, so nothing is flipped in memory.
+    '''
+    base = arr[::-1] if vflip else arr
+    base = base[:,::-1] if hflip else base
+    h,w = base.shape[:2]
+    out = np.empty((n_vert*h,n_horiz*w)+arr.shape[2:],dtype=arr.dtype)
+    for j in range(n_vert):
+        row = base[::-1] if do_flip and j % 2 else base
+        for i in range(n_horiz):
+            tile = row[:,::-1] if do_flip and i % 2 else row
+            out[j*h:(j+1)*h,i*w:(i+1)*w] = tile
+    return out
+
+## fibonacci_spiral copies smaller than this (either way) share a tail layer
+SPIRAL_TAIL = 8
+
+def halve(arr):
+    '''2x2 block average (a ragged last row or column is averaged alone)'''
+    arr = np.asarray(arr,dtype=np.float32)
+    h,w = arr.shape[:2]
+    if h > 1:
+        arr = np.concatenate([arr[:h-h%2].reshape((h//2,2)+arr.shape[1:]).mean(axis=1),
+                              arr[h-h%2:]])
+    if w > 1:
+        arr = np.concatenate([arr[:,:w-w%2].reshape((arr.shape[0],w//2,2)+arr.shape[2:]).mean(axis=2),
+                              arr[:,w-w%2:]],axis=1)
+    return arr
+
+def pyramid_levels(arr):
+    '''arr, then halved again and again, down to a single pixel'''
+    levels = [arr]
+    while max(levels[-1].shape[:2]) > 1:
+        levels.append(halve(levels[-1]))
+    return levels
+
+def resample(arr,h,w,extent=None):
+    '''
+    bilinear resampling of arr to h x w (pixel centers aligned); extent,
+    the (height, width) that arr spans in its own pixels, is its shape
+    unless a pyramid level's ragged last row or column overhangs the image
+    '''
+    def axis_weights(n_out,n_in,span):
+        pos = np.clip((np.arange(n_out)+0.5)*span/n_out - 0.5,0,n_in-1)
+        lo = np.minimum(pos.astype(np.intp),max([n_in-2,0]))
+        return lo,np.minimum(lo+1,n_in-1),(pos-lo).astype(np.float32)
+    arr = np.asarray(arr,dtype=np.float32)
+    span_h,span_w = extent or arr.shape[:2]
+    lo,hi,f = axis_weights(h,arr.shape[0],span_h)
+    f = f.reshape((h,)+(1,)*(arr.ndim-1))
+    arr = arr[lo]*(1-f) + arr[hi]*f
+    lo,hi,f = axis_weights(w,arr.shape[1],span_w)
+    f = f.reshape((1,w)+(1,)*(arr.ndim-2))
+    return arr[:,lo]*(1-f) + arr[:,hi]*f
+
+def from_pyramid(levels,h,w):
+    '''
+    arr resized to h x w, from the smallest level of its pyramid that is
+    still at least h x w, so no more than a factor of 2 is interpolated.
+    Every level's pixels are 2**k pixels of arr apart, so a ragged last
+    row (or column), averaged alone, just overhangs the image.
+    '''
+    h0,w0 = levels[0].shape[:2]
+    k = 0
+    for smaller in levels[1:]:
+        if smaller.shape[0] < h or smaller.shape[1] < w:
+            break
+        k += 1
+    return resample(levels[k],h,w,(h0/2**k,w0/2**k))
+
+def spiral_placements(arr,steps,q_turn):
+    '''
+    [(count, tile, x, y)] for the steps of process.fibonacci_steps:
+    each tile is arr resized (from a pyramid that is built once), then
+    turned count*q_turn quarter turns clockwise
+    '''
+    levels = pyramid_levels(arr)
+    for count,w,h,x,y in steps:
+        tile = np.rot90(from_pyramid(levels,h,w),-(count*q_turn % 4))
+        yield count,tile,x,y
+
+def spiral_tiles(arr,steps,q_turn):
+    '''
+    [(name, tile, x, y)] of the layers of fibonacci_spiral; the tiles
+    smaller than SPIRAL_TAIL are pasted, in order, into one tail tile
+    '''
+    out,tail = [],[]
+    for count,tile,x,y in spiral_placements(arr,steps,q_turn):
+        if min(tile.shape[:2]) < SPIRAL_TAIL:
+            tail.append((tile,x,y))
+        else:
+            out.append(('Spiral %d' % count,tile,x,y))
+    if tail:
+        x0 = min(x for _,x,_ in tail)
+        y0 = min(y for _,_,y in tail)
+        x1 = max(x+t.shape[1] for t,x,_ in tail)
+        y1 = max(y+t.shape[0] for t,_,y in tail)
+        buf = np.zeros((y1-y0,x1-x0)+arr.shape[2:],dtype=np.float32)
+        for tile,x,y in tail:
+            buf[y-y0:y-y0+tile.shape[0],x-x0:x-x0+tile.shape[1]] = tile
+        out.append(('Spiral tail',buf,x0,y0))
+    return out
+
+def spiral_canvas(arr,steps,q_turn):
+    '''
+    fibonacci_spiral drawn straight into one canvas, each copy over the
+    ones before it (Normal mode, full opacity); returns (canvas, x, y),
+    x and y being where the canvas's upper left corner goes.  Each copy
+    replaces what is under it, which is what Normal mode does only if
+    arr is opaque (see is_opaque); otherwise, use spiral_tiles.
+    '''
+    tiles_xy = list(spiral_placements(arr,steps,q_turn))
+    h,w = arr.shape[:2]
+    x0 = min([0] + [x for _,_,x,_ in tiles_xy])
+    y0 = min([0] + [y for _,_,_,y in tiles_xy])
+    x1 = max([w] + [x+t.shape[1] for _,t,x,_ in tiles_xy])
+    y1 = max([h] + [y+t.shape[0] for _,t,_,y in tiles_xy])
+    canvas = np.zeros((y1-y0,x1-x0)+arr.shape[2:],dtype=np.uint8)
+    canvas[-y0:h-y0,-x0:w-x0] = arr
+    for _,tile,x,y in tiles_xy:
+        canvas[y-y0:y-y0+tile.shape[0],x-x0:x-x0+tile.shape[1]] = np.rint(tile)
+    return canvas,x0,y0
@@ -0,0 +1,141 @@
+'''Bulk pixel access: a drawable (or a rectangle of one) as a numpy array'''
+
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License at http://www.gnu.org/licenses for
+# more details.
+
+## Only the gimpfu drawable interface (get_pixel_rgn, flush, merge_shadow,
+## update) is used, so this module does not import gimpfu itself; the
+## FakeDrawable below implements the same interface on a numpy array,
+## so everything that is built on this can be run without the GIMP.
+## Pixels are 8 bits per channel, as the pixel regions deliver them.
+
+from __future__ import print_function, division
+import numpy as np
+
+## rows per pixel-region write; a multiple of the GIMP's 64-pixel tiles
+BAND_ROWS = 256
+
+def rect(drawable,x=0,y=0,w=None,h=None):
+    '''fill in a (x,y,w,h) rectangle, defaulting to the rest of drawable'''
+    w = drawable.width - x if w is None else w
+    h = drawable.height - y if h is None else h
+    if x < 0 or y < 0 or x+w > drawable.width or y+h > drawable.height:
+        raise ValueError('rectangle %s outside %dx%d drawable'
+                         % ((x,y,w,h),drawable.width,drawable.height))
+    return x,y,w,h
+
+def read(drawable,x=0,y=0,w=None,h=None):
+    '''
+    (h,w,bpp) uint8 array of a rectangle of drawable (default: all of it).
+    The array is a read-only view of the bytes the pixel region hands
+    back, so the only copy is the one out of the GIMP's tiles.
+    '''
+    x,y,w,h = rect(drawable,x,y,w,h)
+    rgn = drawable.get_pixel_rgn(x,y,w,h,False,False)
+    return np.frombuffer(rgn[x:x+w,y:y+h],
+                         dtype=np.uint8).reshape(h,w,drawable.bpp)
+
+def to_uint8(arr):
+    '''round and clip to uint8 (no copy if arr is uint8 already)'''
+    if arr.dtype == np.uint8:
+        return np.ascontiguousarray(arr)
+    return np.clip(np.rint(arr),0,255).astype(np.uint8)
+
+def write(drawable,arr,x=0,y=0):
+    '''
+    write an (h,w,bpp) array, rounded and clipped to uint8, into drawable
+    with its upper left corner at (x,y).  This goes through the shadow
+    buffer in bands of BAND_ROWS rows, so a float array is converted a
+    band at a time rather than all at once, and the edit can be undone.
+    '''
+    if arr.ndim == 2:
+        arr = arr[...,None]
+    h,w = arr.shape[:2]
+    if arr.shape[2] != drawable.bpp:
+        raise ValueError('array has %d channels, drawable has %d'
+                         % (arr.shape[2],drawable.bpp))
+    x,y,w,h = rect(drawable,x,y,w,h)
+    rgn = drawable.get_pixel_rgn(x,y,w,h,True,True)
+    for lo in range(0,h,BAND_ROWS):
+        hi = min([lo+BAND_ROWS,h])
+        rgn[x:x+w,y+lo:y+hi] = to_uint8(arr[lo:hi]).tobytes()
+    drawable.flush()
+    drawable.merge_shadow(True)
+    drawable.update(x,y,w,h)
+
+##########################################
+## A stand-in for gimpfu drawables (tests)
+
+class FakePixelRgn:
+    '''the slicing interface of a gimpfu PixelRgn, on a FakeDrawable'''
+    def __init__(self,drawable,x,y,w,h,dirty,shadow):
+        self.drawable = drawable
+        self.x,self.y,self.w,self.h = x,y,w,h
+        self.dirty = dirty
+        self.shadow = shadow
+
+    def _window(self,key):
+        ## like gimpfu, slices are in drawable (not region) coordinates
+        xs,ys = key
+        x0,x1 = xs.start,xs.stop
+        y0,y1 = ys.start,ys.stop
+        if (x0 < self.x or y0 < self.y or
+            x1 > self.x+self.w or y1 > self.y+self.h):
+            raise IndexError('slice outside pixel region')
+        return slice(y0,y1),slice(x0,x1)
+
+    def __getitem__(self,key):
+        return self.drawable.data[self._window(key)].tobytes()
+
+    def __setitem__(self,key,value):
+        if not self.dirty:
+            raise TypeError('pixel region was not opened for writing')
+        ys,xs = self._window(key)
+        target = self.drawable.shadow_data() if self.shadow else self.drawable.data
+        shape = (ys.stop-ys.start,xs.stop-xs.start,self.drawable.bpp)
+        target[ys,xs] = np.frombuffer(value,dtype=np.uint8).reshape(shape)
+
+class FakeDrawable:
+    '''
+    numpy-backed drawable with the parts of the gimpfu interface used
+    by this module (and by the numpy code paths in process.py)
+    '''
+    def __init__(self,data,has_alpha=None,name="Fake",offsets=(0,0)):
+        data = np.asarray(data,dtype=np.uint8)
+        if data.ndim == 2:
+            data = data[...,None]
+        self.data = data.copy()
+        self.height,self.width,self.bpp = data.shape
+        if has_alpha is None:
+            has_alpha = self.bpp in (2,4)
+        self.has_alpha = has_alpha
+        self.name = name
+        self.offsets = offsets
+        self.shadow = None
+        self.updates = []
+
+    def get_pixel_rgn(self,x,y,w,h,dirty=True,shadow=False):
+        return FakePixelRgn(self,x,y,w,h,dirty,shadow)
+
+    def shadow_data(self):
+        if self.shadow is None:
+            self.shadow = self.data.copy()
+        return self.shadow
+
+    def flush(self):
+        pass
+
+    def merge_shadow(self,undo=True):
+        if self.shadow is not None:
+            self.data,self.shadow = self.shadow,None
+
+    def update(self,x,y,w,h):
+        self.updates.append((x,y,w,h))
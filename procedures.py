@@ -0,0 +1,406 @@
+'''The plug-in procedures: one table, registered through process.pfreg'''
+
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License at http://www.gnu.org/licenses for
+# more details.
+
+## Every time it starts with new or changed plug-ins, the GIMP runs each
+## plug-in file in a python interpreter of its own, just to ask what it
+## registers.  theilr.py registers everything below from one interpreter;
+## the single-procedure files (wideblur.py, cheaphdr.py, ...) register
+## just their own entry.  Install one or the other, not both, or each
+## procedure is registered twice.  Nothing here imports numpy; process
+## only does that once a procedure actually runs.
+##
+## New parameters go at the end of a procedure's list; that still
+## changes its pdb signature, so say so under Compatibility in README.md.
+
+from __future__ import print_function, division
+from gimpfu import *
+import process
+
+def wide_blur(img, layer, radius, fast):
+    with process.UndoContext(img):
+        process.wide_blur(img,layer,radius,fast)
+
+def cheap_hdr(img,layer,radius,spread,opacity,fast,preview):
+    ## Note: CheapHDR is applied to the current layer
+    ## May prefer to have it apply to the current visible image
+    with process.UndoContext(img):
+        process.cheap_hdr(img,layer,radius,spread,opacity,fast,preview)
+
+#  Cheap HDR + Unsharp maks + Contrast stretch
+#  Quick AND idiosyncratic -- this is just my personal taste
+def quick_enhance(img,layer,r_hdr,s_hdr,f_hdr,r_sharp,s_l_mode,f_stretch,
+                  engine,preview):
+    '''combines cheap-hdr, sharpen, and stretch'''
+    with process.UndoContext(img):
+        process.quick_enhance(img,layer,r_hdr,s_hdr,f_hdr,r_sharp,s_l_mode,
+                              f_stretch,engine,preview)
+
+def vignette(img,layer,lighten_corners,blur_radius,opacity,noise_spread,fast,
+             preview):
+    with process.UndoContext(img):
+        process.vignette(img,layer,lighten_corners,blur_radius,opacity,
+                         noise_spread,fast,preview)
+
+def jagged_border(img,layer,border_shape,black_border,border_size,
+                  thresh,fill_islands,one_pixel_border,preview):
+    with process.UndoContext(img):
+        process.jagged_border(img,layer,border_shape,black_border,border_size,
+                              thresh,fill_islands,one_pixel_border,preview)
+
+def mirror(img, layer, m_horiz, m_vert, ul_hflip, ul_vflip):
+    with process.UndoContext(img):
+        process.mirror(img, layer, m_horiz, m_vert, ul_hflip, ul_vflip)
+
+def accordion(img, layer, n_horiz, n_vert, do_flip, ul_hflip, ul_vflip):
+    with process.UndoContext(img):
+        process.accordion(img, layer,
+                          int(n_horiz), int(n_vert), ## PF_SPINNER not int's
+                          do_flip,ul_hflip, ul_vflip)
+
+def fibonacci_spiral(img,aspect,q_turn,blend,opacity,merge_down):
+    with process.UndoContext(img):
+        process.fibonacci_spiral(img,aspect,q_turn,blend,opacity,merge_down)
+
+def scale_to_fibonacci(img,squareflag):
+    with process.UndoContext(img):
+        process.scale_to_fibonacci(img,squareflag)
+
+def pan_to_bow(img,angle,arc_up):
+    with process.UndoContext(img):
+        process.pan_to_bow(img,angle,arc_up)
+
+def infinity(img,bkg_color,pad,squeeze,one_layer):
+    with process.UndoContext(img):
+        process.infinity(img,bkg_color,pad,int(squeeze),one_layer)
+
+#  Scale Layer to Image size
+#  Useful for when you scale a layer to some other size
+#  for some kind of processing, and want to scale back
+def scale_layer_to_image_size(img,layer):
+    '''scale layer to have same size as canvas'''
+    with process.UndoContext(img):
+        pdb.gimp_layer_scale(layer,img.width,img.height,True)
+
+#  Wrap the G'MIC Paint Daub filter with a scale/rescale
+#  so that a greater range of swirl sizes are available
+def wrapped_paint_daub(img,layer,f_scale,
+                       n_it,amp,sharp,aniso,sigma,di,eql,plasma,p_scale):
+    '''wrap GMIC paint daub'''
+    with process.UndoContext(img):
+        pd_layer = process.visible_base(img,name="PaintDaub")
+        wold = pd_layer.width
+        hold = pd_layer.height
+        wnew = wold * f_scale // 100
+        hnew = hold * f_scale // 100
+        pdb.gimp_layer_scale(pd_layer,wnew,hnew,0)
+        cmd = ('samj_Barbouillage_Paint_Daub '
+               '%d,%d,%d,%.1f,%.1f,%.1f,%d,%d,%d'
+               % (n_it,amp,sharp,aniso,sigma,di,int(eql),plasma,p_scale))
+        print('cmd=',cmd)
+        pdb.plug_in_gmic_qt(img,layer,1,0,cmd)
+        pdb.gimp_layer_scale(pd_layer,wold,hold,0)
+
+#########################
+## Longer descriptions
+
+VIGNETTE='''Darkens the corners in a soft way
+
+USAGE NOTES:  Since this non-destructively produces an overlay layer
+you can make tweaks to the effect.
+'''
+
+JAGGED_BORDER='''
+Creates a white (or black) border around an image that merges in with
+the image so that on a larger white (or black) background, the image
+appears to have a ragged border.  This is similar to the Gimp's Fuzzy
+Border, but it adapts its jaggedness to the image. (Also unlike Fuzzy
+Border, it is deterministic, it does not depend on random number
+seeds.)
+
+USAGE NOTES: Since this non-destructively produces a border as a
+separate layer, you can tweak the border; eg smooth it (yuck, then it's
+not very jagged anymore!), change its color, use it to build some
+fancy drop-shadow, etc.  A number of effects can be obtained by using
+the white/black border layer and/or its inverse as a layer mask.
+'''
+
+FIBONACCI_SPIRAL='''
+Converts a square image into a Fibonacci spiral with many
+copies of the image arranged in a spiral pattern in a
+golden rectangle.
+'''
+
+SCALE_TO_FIBONACCI='''
+Ensures that a rectangular image has pixel counts for height and
+width that are successive Fibonacci numbers; and that a square
+image has height and width that are the same Fibonacci number.
+If not, then the image is rescaled so that the longest dimension
+does not increase.
+Note, operation is applied to the whole image, not just a layer.
+'''
+
+# NOTE: Pan to Bow is very similar in purpose to the 'arclayer.py'
+# plug-in written by Akkana Peck (2002) http://www.shallowsky.com/software/
+
+PAN_TO_BOW='''
+Takes a wide panoramic image and bends it into a rainbow-shaped
+image in a way that (roughly) maintains the scale in the original
+image.
+
+USAGE NOTES:
+Although the new image keeps the same scale as the original, the
+created image will have a larger number of pixels (because of all
+the empty pixels).
+
+The attempt at non-distortion applies only to the central horizontal
+band of the image. Depending on the initial aspect ratio, you will
+see distortion above and below that centerline.  (The larger the
+initial aspect ratio, the smaller the distortion will be.)
+
+BUGS:
+
+If the aspect ratio isn't wide enough, then aspect ratio cannot
+be preserved.  (This isn't actually a bug, it's basic geometry.)
+In particular, you want width/height > angle / 114.6.
+For instance, for default 180-degree bow, width/height > 1.57
+The program will still "work" in this case, but scale and aspect
+ratio will be compromised.
+
+Without numpy, it uses plug-in-polar-coords, and has, as an
+intermediate step, to resize the image, in some cases by quite a large
+factor.  (And pan images tend to be pretty large to begin with.)  So
+there could be problems on computers with limited memory; angles
+below 45 degrees would lead to huge intermediate images, so without
+numpy they are raised to 45 (with a message).  With numpy, each
+output pixel is interpolated directly from the input, so memory is
+just input plus output, and any angle from 1 to 360 is fine.
+
+Currently, this tries to maintain scale along the middle of the
+imageone can imagine situations when it would be preferable to
+keep the scale accurate at the top or the bottom of the image.
+'''
+
+INFINITY='''
+Builds from Pan to Bow: takes an image, and bends it into both
+rainbow and smile shapes of 180 degrees.  Then makes flipped copies
+of each and from those four components, combines them into a
+figure-8 racetrack that kind of looks like an infinity symbol
+'''
+
+#########################
+## The table
+
+## (function, arguments, other keywords for pfreg); the keywords
+## author and menu are the same for all of them (see register)
+PROCEDURES = [
+    (wide_blur,
+     [
+         (PF_IMAGE, "image", "Input image", None),
+         (PF_DRAWABLE, "drawable", "Input drawable", None),
+         (PF_SLIDER, "raidus", "Radius", 500, (0,1500,10)),
+         (PF_BOOL, "fast", "Fast (pyramid) blur", False),
+     ],
+     dict(name="Wide blur",
+          description="Gaussian blur of possibly large radii",
+          year=2022)),
+    (cheap_hdr,
+     [
+         (PF_IMAGE, "image", "Input image", None),
+         (PF_DRAWABLE, "drawable", "Input drawable", None),
+         (PF_SLIDER, "radius", "Radius", 500, (0, 1500, 10)),
+         (PF_SLIDER, "spread", "Spread", 50, (0, 250, 10)),
+         (PF_SLIDER, "opacity", "Factor", 50, (0, 100, 5)),
+         (PF_BOOL, "fast", "Fast (pyramid) blur", False),
+         (PF_BOOL, "preview", "Preview (on a small proxy)", False),
+     ],
+     dict(name="Cheap HDR",
+          description="Reduce global contrast while keeping local contrast",
+          year=2022)),
+    (quick_enhance,
+     [
+         (PF_IMAGE, "image", "Input image", None),
+         (PF_DRAWABLE, "drawable", "Input drawable", None),
+         (PF_SLIDER, "r_hdr", "HDR Radius", 750, (0, 1500, 1)),
+         (PF_SLIDER, "s_hdr", "HDR Spread", 50, (0, 250, 10)),
+         (PF_SLIDER, "f_hdr", "HDR factor", 50, (0, 100, 1)),
+         (PF_SLIDER, "r_sharp", "Unsharp Radius", 9, (0, 25, 1)),
+         (PF_RADIO, "s_l_mode","Sharpen Layer Mode",
+          LAYER_MODE_DARKEN_ONLY,
+          (("darken", LAYER_MODE_DARKEN_ONLY),
+           ("lighten", LAYER_MODE_LIGHTEN_ONLY),
+           ("normal", LAYER_MODE_NORMAL))),
+         (PF_SLIDER, "f_stretch","Stretch factor",50, (0,100,1)),
+         (PF_OPTION, "engine", "Engine", 0,
+          ("Step by step",
+           "Fused, single layer",
+           "Fused, layer stack")),
+         (PF_BOOL, "preview", "Preview (on a small proxy)", False),
+     ],
+     dict(name="Quick Enhance",
+          description="Cheap HDR, then sharpen, then stretch",
+          year=2022)),
+    (vignette,
+     [
+         (PF_IMAGE, "img", "Input image", None),
+         (PF_LAYER, "layer", "Input layer", None),
+         (PF_OPTION, "lighten_corners", "Corners", 0,
+          ("Darken", "Lighten")),
+         (PF_SLIDER, "blur_radius", "Blur", 500, (50,2500,50)),
+         (PF_SLIDER, "opacity", "Opacity", 50, (0, 100, 1)),
+         (PF_BOOL, "noise_spread", "Spread noise", True),
+         (PF_BOOL, "fast", "Fast (pyramid) blur", False),
+         (PF_BOOL, "preview", "Preview (on a small proxy)", False),
+     ],
+     dict(name="Vignette",
+          description=VIGNETTE,
+          year="2022")),
+    (jagged_border,
+     [
+         (PF_IMAGE, "img", "Input image", None),
+         (PF_LAYER, "layer", "Input layer", None),
+         (PF_OPTION, "border_shape", "Border shape", 0,
+          ("Rectangular",
+           "Horizontal only",
+           "Vertical only",
+           "Elliptical",
+           "Rounded Rectangular",
+          )
+         ),
+         (PF_OPTION, "black_border", "Border Color", 0,
+          ("Black", "White")),
+         (PF_SLIDER, "border_size", "Border width", 50, (5, 1000, 5)),
+         (PF_SLIDER, "threshold", "Threshold", 1, (1, 255, 1)),
+         (PF_BOOL, "fill_islands", "Fill in islands", True),
+         (PF_BOOL, "one_pixel_border", "One-pixel border", True),
+         (PF_BOOL, "preview", "Preview (on a small proxy)", False),
+     ],
+     dict(name="Jagged Border",
+          description=JAGGED_BORDER,
+          year="2022")),
+    (mirror,
+     [
+         (PF_IMAGE, "image", "Input image", None),
+         (PF_DRAWABLE, "drawable", "Input drawable", None),
+         (PF_BOOL, "m_horiz", "Horizontal mirror", True),
+         (PF_BOOL, "m_vert", "Vertical mirror", True),
+         (PF_BOOL, "ul_hflip", "Horiz flip upper-left", False),
+         (PF_BOOL, "ul_vflip", "Vert flip upper left", False),
+     ],
+     dict(name="Mirror",
+          description="Reflect an image (possibly multiple times)",
+          year=2022)),
+    (accordion,
+     [
+         (PF_IMAGE, "image", "Input image", None),
+         (PF_DRAWABLE, "drawable", "Input drawable", None),
+         (PF_SPINNER, "n_horiz", "Horizontal accordion", 2, (1,10,1)),
+         (PF_SPINNER, "n_vert", "Vertical accordion", 2, (1,10,1)),
+         (PF_BOOL, "do_flip", "Mirror adjacent tiles", True),
+         (PF_BOOL, "ul_hflip", "Horiz flip upper-left", False),
+         (PF_BOOL, "ul_vflip", "Vert flip upper left", False),
+     ],
+     dict(name="Accordion",
+          description="Folds/mirros an image (possibly multiple times)",
+          year=2022)),
+    (fibonacci_spiral,
+     [
+         (PF_IMAGE, "image", "Input image", None),
+         (PF_OPTION, "aspect", "Aspect", 1,
+          ("Rectangle", "Square")),
+         (PF_OPTION, "q_turn", "Rotate", 1,
+          ("No Rotation",
+           "90 degrees (CW)",
+           "180 degrees",
+           "270 degrees (CCW)")),
+         (PF_RADIO, "blend", "Blend Mode:", LAYER_MODE_NORMAL,
+          (("Normal", LAYER_MODE_NORMAL),
+           ("Overlay", LAYER_MODE_OVERLAY),
+           ("Multiply", LAYER_MODE_MULTIPLY),
+           ("Add", LAYER_MODE_ADDITION),
+           ("Darken", LAYER_MODE_DARKEN_ONLY),
+           ("Lighten", LAYER_MODE_LIGHTEN_ONLY),
+           ("Dodge", LAYER_MODE_DODGE),
+           ("Burn", LAYER_MODE_BURN),
+           )),
+         (PF_SLIDER, "opacity", "Opacity", 100, (0, 100, 1)),
+         (PF_BOOL, "merge_down", "Merge Layers", False),
+     ],
+     dict(name="Fibonacci Spiral...",
+          description=FIBONACCI_SPIRAL,
+          year="2009-2022")),
+    (scale_to_fibonacci,
+     [
+         (PF_IMAGE, "image", "Input image", None),
+         (PF_BOOL, "squareflag", "Make square", False),
+     ],
+     dict(name="Scale to Fibonacci...",
+          description=SCALE_TO_FIBONACCI,
+          year="2009-2022")),
+    (pan_to_bow,
+     [
+         (PF_IMAGE, "img", "Input image", None),
+         (PF_SPINNER, "angle", "Angle of circle", 180, (1,360,1)),
+         (PF_OPTION, "arc_up", "Arc direction", 0,
+          ("Rainbow", "Smile")),
+     ],
+     dict(name="Pan to Bow",
+          description=PAN_TO_BOW,
+          year="2022")),
+    (infinity,
+     [
+         (PF_IMAGE, "img", "Input image", None),
+         (PF_COLOR, "bkg_color", "Background color", (1.,1.,1.)),
+         (PF_SPINNER, "pad", "Pad angle", 0, (0, 270, 15)),
+         (PF_BOOL, "squeeze", "Squeeze middle", False),
+         (PF_BOOL, "one_layer", "Single layer (needs numpy)", False),
+     ],
+     dict(name="Pan to Infinity",
+          description=INFINITY,
+          year="2022")),
+    (scale_layer_to_image_size,
+     [
+         (PF_IMAGE, "image", "Input image", None),
+         (PF_DRAWABLE, "drawable", "Input drawable", None),
+     ],
+     dict(name="Scale Layer to Image",
+          description="Scale Layer to Image Size",
+          year=2023)),
+    (wrapped_paint_daub,
+     [
+         (PF_IMAGE, "image", "Input image", None),
+         (PF_DRAWABLE, "drawable", "Input drawable", None),
+         (PF_SLIDER, "f_scale", "Scale factor (percent)",
+          100, (5, 200, 1)),
+         (PF_SLIDER, "n_it", "Iterations (1-3)", 2, (1,5,1)),
+         (PF_SLIDER, "amp", "Amplitude", 2, (1,5,1)),
+         (PF_SLIDER, "sharp","Sharpness", 100, (0, 500, 1)),
+         (PF_FLOAT, "aniso","Anisotropy (0-1)", 0.2),
+         (PF_FLOAT, "sigma","Sigma (0-5)",1),
+         (PF_FLOAT, "di","DI (0-10)",4),
+         (PF_BOOL, "eql", "Equalize", True),
+         (PF_OPTION, "plasma", "Plasma", 0,
+          ("Non/Without", "Colors A", "Colors B")),
+         (PF_SLIDER, "p_scale", "Scale Plasma", 8, (1,30,1)),
+     ],
+     dict(name="Wrap Daub",
+          description="Wrap GMIC Paint Daub",
+          year=2023)),
+]
+
+def register(*names):
+    '''register the named procedures (default: all of them) with pfreg'''
+    for fcn,arglist,kw in PROCEDURES:
+        if names and fcn.__name__ not in names:
+            continue
+        process.pfreg(fcn,arglist,author="theilr",
+                      menu="<Image>/Filters/theilr",**kw)
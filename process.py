@@ -12,8 +12,32 @@
 # more details.
 
 from __future__ import print_function, division
+import hashlib
 import math
 from gimpfu import *
+from transform import Transform
+
+## numpy is optional; without it, the pdb-only code paths are used.
+## It is only imported once a procedure runs (see load_numpy), not when
+## the GIMP starts up and queries the plug-ins, which happens far more
+## often; so these stay None until then.
+pixels = fastblur = npprocess = remap = imagestats = None
+
+def load_numpy():
+    '''import the numpy modules, if they are available (once)'''
+    global pixels,fastblur,npprocess,remap,imagestats,_numpy_tried
+    if _numpy_tried:
+        return
+    _numpy_tried = True
+    try:
+        import pixels
+        import fastblur
+        import npprocess
+        import remap
+        import imagestats
+    except ImportError:
+        pixels = fastblur = npprocess = remap = imagestats = None
+_numpy_tried = False
 
 ############################
 ## General utility functions
@@ -28,10 +52,23 @@ def flip_v(layer):
 def flip_h(layer):
     return flip_orient(layer,ORIENTATION_HORIZONTAL)
 def flip(layer,hflip=False,vflip=False):
-    if hflip:
-        layer = flip_h(layer)
-    if vflip:
-        layer = flip_v(layer)
+    ## both flips at once are a single half turn
+    return transform_layer(layer,Transform(hflip,vflip))
+
+def transform_layer(layer,xform):
+    '''
+    apply a Transform (of flips, quarter turns, and an offset) to a
+    layer, with as few pdb transforms as it takes; returns the layer
+    '''
+    for step,arg in xform.steps():
+        if step == 'flip':
+            layer = flip_h(layer) if arg == 'horizontal' else flip_v(layer)
+        else:
+            rotate_type = (ROTATE_90,ROTATE_180,ROTATE_270)[arg-1]
+            layer = pdb.gimp_item_transform_rotate_simple(layer,rotate_type,
+                                                          True,0,0)
+    if xform.dx or xform.dy:
+        layer.translate(xform.dx,xform.dy)
     return layer
 
 def visible_base(img,hflip=False,vflip=False,name="VisibleBase"):
@@ -43,6 +80,55 @@ def visible_base(img,hflip=False,vflip=False,name="VisibleBase"):
     layer = flip(layer,hflip,vflip)
     return layer
 
+## modes in which an opaque layer at full opacity, over an opaque
+## image, looks the same whether the GIMP composites in linear or in
+## perceptual (sRGB) light: each picks one value or the other
+SPACE_FREE_MODES = (LAYER_MODE_NORMAL,LAYER_MODE_DARKEN_ONLY,
+                    LAYER_MODE_LIGHTEN_ONLY)
+
+def composite_matches(layer,base,top,has_alpha):
+    '''
+    True if what the GIMP shows, with layer (whose pixels are top) over
+    an image whose pixels are base, is what npprocess.composite works
+    out.  That works on the sRGB values, while the GIMP 2.10 mixes by
+    opacity and alpha in linear light unless the layer is set to
+    composite (and blend) in perceptual light.
+    '''
+    if (layer.mode in SPACE_FREE_MODES and layer.opacity == 100 and
+        npprocess.is_opaque(base,has_alpha) and
+        npprocess.is_opaque(top,has_alpha)):
+        return True
+    perceptual = LAYER_COLOR_SPACE_RGB_PERCEPTUAL
+    return (pdb.gimp_layer_get_composite_space(layer) == perceptual and
+            pdb.gimp_layer_get_blend_space(layer) == perceptual)
+
+def feed_visible(img,layer,base,top,mode,has_alpha):
+    '''
+    a step that read the visible image (base) and put layer (whose
+    pixels are top, in mode) over it, has all it takes to work out what
+    img shows now: feed that to imagestats, so a later step (eg,
+    stretch) can have it without copying and reading the image again.
+    Only if that is what the GIMP shows (see composite_matches); if not,
+    the later step reads the visible image itself.
+    '''
+    if not composite_matches(layer,base,top,has_alpha):
+        return
+    opacity = layer.opacity/100
+    imagestats.feed(visible_state(img),lambda:
+                    npprocess.composite(base,top,mode,opacity,has_alpha),
+                    has_alpha)
+
+def visible_state(img):
+    '''
+    key for what img shows now (see imagestats): its layers, and how
+    they are stacked.  Within one plug-in call, only this code changes
+    the pixels, so a step that feeds imagestats keys it by the state
+    it leaves the image in.
+    '''
+    return (img.ID,img.width,img.height) + tuple(
+        (layer.ID,layer.visible,layer.mode,layer.opacity,layer.offsets)
+        for layer in img.layers)
+
 def layer_fill_color(layer,color,respect_selection=False):
     '''
     fill a layer with a solid color,
@@ -56,6 +142,13 @@ def layer_fill_color(layer,color,respect_selection=False):
         layer.fill(FILL_FOREGROUND)
     gimp.set_foreground(fg_orig)
 
+def color_to_rgb(color):
+    '''[r,g,b] in 0-255 of a gimpcolor.RGB, or of a tuple of 0-1 or 0-255'''
+    rgb = [color.r,color.g,color.b] if hasattr(color,'r') else list(color[:3])
+    if all(isinstance(c,float) for c in rgb) and max(rgb) <= 1:
+        rgb = [255*c for c in rgb]
+    return rgb
+
 def merge_down_active_layer(img):
     '''
     to keep layers from piling up, merge down from the current layer,
@@ -64,11 +157,118 @@ def merge_down_active_layer(img):
     img.merge_down(img.active_layer,0)
     return img.active_layer
 
+#############################
+## Previews on a small proxy
+
+## longest side of the proxy image that previews are made on
+PREVIEW_SIZE = 1024
+## parasite (on the full image) that remembers its proxy
+PREVIEW_PARASITE = "theilr-preview-proxy"
+## longest side of the thumbnail that tells whether img has been edited
+PREVIEW_THUMBNAIL = 128
+
+def preview_state(img):
+    '''
+    digest of what img looks like: its visible_state, which changes
+    when layers are added, moved or hidden, and a small thumbnail of it,
+    which changes when their pixels are edited
+    '''
+    size = min([PREVIEW_THUMBNAIL,max([img.width,img.height])])
+    thumbnail = pdb.gimp_image_thumbnail(img,size,size)
+    digest = hashlib.sha1(repr(visible_state(img)).encode())
+    digest.update(bytearray(thumbnail[-1]))
+    return digest.hexdigest()
+
+def preview_proxy(img):
+    '''
+    (proxy, base layer, factor) for a preview of img: the proxy is the
+    visible image scaled down by factor, in a display of its own.  It is
+    found again through a parasite on img, so a series of previews scales
+    the image down only once; the layers of the previous preview are
+    removed.  If img has changed since (see preview_state), the proxy is
+    made again from it, in the same display.
+    '''
+    factor = max([1.,max([img.width,img.height])/PREVIEW_SIZE])
+    w = max([1,int(round(img.width/factor))])
+    h = max([1,int(round(img.height/factor))])
+    state = preview_state(img)
+    proxy = None
+    parasite = img.parasite_find(PREVIEW_PARASITE)
+    if parasite:
+        proxy_id,_,proxy_state = parasite.data.partition(" ")
+        for image in gimp.image_list():
+            if image.ID == int(proxy_id):
+                proxy = image
+        if proxy and proxy_state == state:
+            base = proxy.layers[-1]
+            for layer in proxy.layers[:-1]:
+                proxy.remove_layer(layer)
+            pdb.gimp_selection_none(proxy)
+            return proxy,base,factor
+
+    if proxy:
+        for layer in proxy.layers[:]:
+            proxy.remove_layer(layer)
+        pdb.gimp_selection_none(proxy)
+        proxy.resize(w,h,0,0)
+    else:
+        proxy = gimp.Image(w,h,img.base_type)
+        ## nothing done to a proxy needs undoing
+        pdb.gimp_image_undo_disable(proxy)
+        gimp.Display(proxy)
+    base = pdb.gimp_layer_new_from_visible(img,proxy,"Preview")
+    proxy.add_layer(base,0)
+    base.scale(w,h,False)
+    base.set_offsets(0,0)
+    ## not part of what the user can undo in img
+    UndoContext.after(img,lambda: img.attach_new_parasite(
+        PREVIEW_PARASITE,0,"%d %s" % (proxy.ID,state)))
+    return proxy,base,factor
+
+def run_preview(img,render):
+    '''render(proxy,base,factor) on the preview proxy of img, and show it'''
+    proxy,base,factor = preview_proxy(img)
+    render(proxy,base,factor)
+    gimp.displays_flush()
+    return proxy
+
 #############################
 ## Image processing functions
 
-def wide_blur(img, layer, radius):
-    '''apply gauss-filter in place to layer'''
+def wide_blur(img, layer, radius, fast=False, inner=None):
+    '''
+    apply gauss-filter in place to layer;
+    if fast, blur a decimated copy and smoothly scale it back up;
+    inner is an optional (x,y,w,h) rectangle over which the layer is
+    known to be a constant color: only what is around it gets blurred
+    '''
+    ## with numpy, one running-sum blur whose cost doesn't grow with radius
+    ## (pdb fallback is kept for selections, which plug-in-gauss respects);
+    ## like plug-in-gauss, it blurs in linear light; the same pixels
+    ## blurred the same way again come from the cache
+    if fastblur and pdb.gimp_selection_is_empty(img):
+        sigma = fastblur.wide_blur_sigma(radius)
+        if sigma:
+            if inner:
+                x,y,w,h = inner
+                inner = (y,y+h,x,x+w)
+            arr = npprocess.blur_linear(pixels.read(layer),sigma,
+                                        layer.has_alpha,fast,inner)
+            pixels.write(layer,arr)
+        return
+
+    ## without numpy, the pyramid is scale down, blur, scale back up
+    f = int(radius // 125)
+    if (fast and f > 1 and pdb.gimp_item_is_layer(layer)
+        and pdb.gimp_selection_is_empty(img)):
+        w,h = layer.width,layer.height
+        x,y = layer.offsets
+        pdb.gimp_layer_scale(layer,max([1,w//f]),max([1,h//f]),True)
+        wide_blur(img,layer,radius/f)
+        pdb.gimp_layer_scale(layer,w,h,True)
+        layer.set_offsets(x,y)
+        return
+
     ## multiple applications of gauss-filter if radius > 500
 
     # How many times
@@ -78,37 +278,182 @@ def wide_blur(img, layer, radius):
     for _ in range(nruns):
         pdb.plug_in_gauss(img,layer,radius, radius, 0)
 
-def cheap_hdr(img,layer,r_blur,r_spread,f_opacity):
-    '''reduce global contrast without affecting local contrast'''
+def cheap_hdr(img,layer,r_blur,r_spread,f_opacity,fast=False,preview=False):
+    '''
+    reduce global contrast without affecting local contrast;
+    with preview, it is done on a proxy (see preview_proxy),
+    with the blur radius and spread scaled down to match
+    '''
     ## then later on when you stretch contrast globally,
     ## you effectively enhance local contrast
+    if preview:
+        return run_preview(img,lambda proxy,base,f:
+                           cheap_hdr(proxy,base,r_blur/f,r_spread/f,
+                                     f_opacity,fast))
     ov_layer = visible_base(img,name="Cheap HDR")
-    wide_blur(img,ov_layer,r_blur)
-    if r_spread:
-        pdb.plug_in_spread(img,ov_layer,r_spread,r_spread)
-    pdb.gimp_drawable_desaturate(ov_layer,3)
-    pdb.gimp_invert(ov_layer)
+    base = None
+    if npprocess and pdb.gimp_selection_is_empty(img):
+        ## desaturate first, so only the one luminance plane is blurred;
+        ## spread just moves pixels around, so it can come after invert,
+        ## and is done on that plane too (reproducibly: it is seeded)
+        base = pixels.read(ov_layer)
+        arr = npprocess.cheap_hdr_overlay(base,
+                                          fastblur.wide_blur_sigma(r_blur),
+                                          ov_layer.has_alpha,fast,r_spread)
+        pixels.write(ov_layer,arr)
+        gray = pixels.to_uint8(arr[...,:1])
+        del arr
+    else:
+        wide_blur(img,ov_layer,r_blur,fast)
+        if r_spread:
+            pdb.plug_in_spread(img,ov_layer,r_spread,r_spread)
+        pdb.gimp_drawable_desaturate(ov_layer,3)
+        pdb.gimp_invert(ov_layer)
     ov_layer.mode = LAYER_MODE_OVERLAY
     ov_layer.opacity = f_opacity
+    if base is not None:
+        feed_visible(img,ov_layer,base,gray,'overlay',ov_layer.has_alpha)
 
 def sharpen(img,layer,r_sharp,s_l_mode):
     '''makes a new layer that is unsharp-mask of visible image'''
     sh_layer = visible_base(img,name="Sharpened")
-    pdb.plug_in_unsharp_mask(img,sh_layer,r_sharp,0.5,0)
+    base = None
+    if npprocess and pdb.gimp_selection_is_empty(img):
+        base = pixels.read(sh_layer)
+        arr = pixels.to_uint8(npprocess.sharpen(base,r_sharp,
+                                                sh_layer.has_alpha))
+        pixels.write(sh_layer,arr)
+    else:
+        pdb.plug_in_unsharp_mask(img,sh_layer,r_sharp,0.5,0)
     sh_layer.mode = s_l_mode
+    if base is not None and s_l_mode in SHARPEN_MODES:
+        feed_visible(img,sh_layer,base,arr,SHARPEN_MODES[s_l_mode],
+                     sh_layer.has_alpha)
 
 def stretch(img,layer,f_stretch):
     '''makes a new layer that stretches contrast of visible image'''
-    st_layer = visible_base(img,name="Stretched")
-    pdb.gimp_drawable_levels_stretch(st_layer)
-    #pdb.plug_in_c_astretch(img,st_layer)
+    if npprocess and pdb.gimp_selection_is_empty(img):
+        ## if the step before fed imagestats what the image shows,
+        ## it need not be copied and read again
+        state = visible_state(img)
+        arr = imagestats.pixels(state)
+        if arr is None:
+            st_layer = visible_base(img,name="Stretched")
+            arr = pixels.read(st_layer)
+            stats = None
+        else:
+            st_layer = img.new_layer("Stretched",img.width,img.height)
+            stats = imagestats.stats(state)
+        pixels.write(st_layer,npprocess.levels_stretch(arr,st_layer.has_alpha,
+                                                       stats))
+    else:
+        st_layer = visible_base(img,name="Stretched")
+        pdb.gimp_drawable_levels_stretch(st_layer)
+        #pdb.plug_in_c_astretch(img,st_layer)
     st_layer.opacity = f_stretch
 
-def vignette(img,layer,lighten_corners,blur_radius,opacity,noise_spread):
+## names of the sharpen layer modes, for the numpy engine
+SHARPEN_MODES = {LAYER_MODE_DARKEN_ONLY: 'darken',
+                 LAYER_MODE_LIGHTEN_ONLY: 'lighten',
+                 LAYER_MODE_NORMAL: 'normal'}
+
+def quick_enhance(img,layer,r_hdr,s_hdr,f_hdr,r_sharp,s_l_mode,f_stretch,
+                  engine=0,preview=False):
+    '''
+    combines cheap-hdr, sharpen, and stretch
+    engine: 0 for step by step, 1 for fused into a single layer,
+            2 for fused but producing the same layers as step by step
+    preview: if True, on a proxy, with the radii and spread scaled down
+    '''
+    if preview:
+        return run_preview(img,lambda proxy,base,f:
+                           quick_enhance(proxy,base,r_hdr/f,s_hdr/f,f_hdr,
+                                         r_sharp/f,s_l_mode,f_stretch,engine))
+    ## the fused engine has only the modes the sharpen radio offers;
+    ## for any other, the step-by-step version lets the GIMP blend
+    if (engine and npprocess and s_l_mode in SHARPEN_MODES and
+        pdb.gimp_selection_is_empty(img)):
+        quick_enhance_fused(img,r_hdr,s_hdr,f_hdr,r_sharp,s_l_mode,f_stretch,
+                            stack=(engine == 2))
+        return
+    cheap_hdr(img,layer,r_hdr,s_hdr,f_hdr)
+    sharpen(img,layer,r_sharp,s_l_mode)
+    if f_stretch:
+        stretch(img,layer,f_stretch)
+    else:
+        visible_base(img,name="QuickEnhanced")
+
+def quick_enhance_fused(img,r_hdr,s_hdr,f_hdr,r_sharp,s_l_mode,f_stretch,
+                        stack=False,fast=False):
+    '''
+    cheap-hdr, sharpen, and stretch from a single copy of the visible image,
+    all in one numpy pipeline; writes one layer, or if stack, three.
+    s_l_mode must be one of SHARPEN_MODES.
+    '''
+    if s_l_mode not in SHARPEN_MODES:
+        raise ValueError('sharpen layer mode %s is not one of %s'
+                         % (s_l_mode,sorted(SHARPEN_MODES)))
+    base = visible_base(img,name="QuickEnhanced")
+    arrs = npprocess.quick_enhance(pixels.read(base),
+                                   fastblur.wide_blur_sigma(r_hdr),
+                                   s_hdr,f_hdr/100,r_sharp,
+                                   SHARPEN_MODES[s_l_mode],f_stretch/100,
+                                   base.has_alpha,fast,stack)
+    if not stack:
+        pixels.write(base,arrs[0])
+        return base
+
+    ## re-use the visible copy for the bottom layer of the stack
+    hdr,sharp,last = arrs
+    base.name = "Cheap HDR"
+    pixels.write(base,hdr)
+    base.mode = LAYER_MODE_OVERLAY
+    base.opacity = f_hdr
+    sh_layer = img.new_layer("Sharpened",img.width,img.height,mode=s_l_mode)
+    pixels.write(sh_layer,sharp)
+    if f_stretch:
+        st_layer = img.new_layer("Stretched",img.width,img.height,
+                                 opacity=f_stretch)
+    else:
+        st_layer = img.new_layer("QuickEnhanced",img.width,img.height)
+    pixels.write(st_layer,last)
+    return st_layer
+
+def vignette(img,layer,lighten_corners,blur_radius,opacity,noise_spread,
+             fast=False,preview=False,max_spread=50):
+    '''
+    darken (or lighten) the corners, in an overlay layer;
+    with preview, on a proxy, with the blur and spread scaled down
+    '''
+    if preview:
+        return run_preview(img,lambda proxy,base,f:
+                           vignette(proxy,base,lighten_corners,blur_radius/f,
+                                    opacity,noise_spread,fast,
+                                    max_spread=max_spread/f))
 
     ## make a new layer
     vig_layer = img.new_layer("Vignette",img.width,img.height,
                               opacity=opacity,mode=LAYER_MODE_OVERLAY)
+    ## why spread it more than 50 pixels?
+    spread = min([max_spread,blur_radius]) if noise_spread else 0
+    if npprocess:
+        ## the blurred ellipse is computed directly, on a single plane,
+        ## and the noise is spread on that plane too
+        arr = npprocess.vignette(img.height,img.width,lighten_corners,
+                                 fastblur.wide_blur_sigma(blur_radius),
+                                 vig_layer.bpp,vig_layer.has_alpha,spread)
+        pixels.write(vig_layer,arr)
+        ## as the pdb version does, leave nothing selected
+        pdb.gimp_selection_none(img)
+        return
+
+    vignette_pdb(img,vig_layer,lighten_corners,blur_radius,fast)
+    ## maybe spread noise
+    if spread:
+        pdb.plug_in_spread(img,vig_layer,spread,spread)
+
+def vignette_pdb(img,vig_layer,lighten_corners,blur_radius,fast=False):
+    '''pdb version of the gray ellipse and blur in vignette'''
     ## paint it white (or black)
     pdb.gimp_drawable_fill(vig_layer,WHITE_FILL)
     if not lighten_corners:
@@ -125,13 +470,16 @@ def vignette(img,layer,lighten_corners,blur_radius,opacity,noise_spread):
     ## un-select the ellipse selection
     pdb.gimp_selection_none(img)
 
-    ## blur the gray ellipse into the light or dark corners
-    wide_blur(img,vig_layer,blur_radius)
-
-    ## maybe spread noise
-    if noise_spread:
-        ## why spread it more than 50 pixels?
-        pdb.plug_in_spread(img,vig_layer,min([50,blur_radius]),min([50,blur_radius]))
+    ## blur the gray ellipse into the light or dark corners; the middle
+    ## of the ellipse stays gray, so (with numpy) only what is around it
+    ## is blurred.  The plug-in only comes here without numpy, when inner
+    ## is not used; it matters when this is called on its own, eg from
+    ## the console to compare with the numpy vignette.
+    inner = None
+    if npprocess:
+        y0,y1,x0,x1 = npprocess.ellipse_inner_rect(0,img.height,0,img.width)
+        inner = (x0,y0,x1-x0,y1-y0)
+    wide_blur(img,vig_layer,blur_radius,fast,inner)
 
 ###############################
 ## Image manipulation functions
@@ -151,10 +499,30 @@ def reflect(img,orientation):
     nextlayer = flip_orient(nextlayer,orientation)
     pdb.gimp_image_merge_down(img,nextlayer,0)
 
+def reflections(img,name,n_horiz,n_vert,do_flip,hflip,vflip):
+    '''
+    numpy engine for mirror and accordion: the visible image, tiled
+    n_horiz x n_vert (every other tile flipped, if do_flip), made in one
+    array and written once into a single layer, instead of flipping,
+    offsetting, and merging a layer per tile
+    '''
+    layer = visible_base(img,name=name)
+    arr = npprocess.reflections(pixels.read(layer),n_horiz,n_vert,do_flip,
+                                hflip,vflip)
+    h,w = arr.shape[:2]
+    img.resize(w,h,0,0)
+    layer.resize(w,h,0,0)
+    pixels.write(layer,arr)
+    return layer
+
 def mirror(img, layer, m_horiz, m_vert, ul_hflip, ul_vflip):
     '''abut visible with reflections: horizontal or vertical or both'''
 
     ## Mirror is like 'accordion' but only single reflections allowed
+    if npprocess:
+        reflections(img,"Mirror",2 if m_horiz else 1,2 if m_vert else 1,
+                    True,ul_hflip,ul_vflip)
+        return
 
     ## first copy visble to layer and flip if needed
     layer = visible_base(img,hflip=ul_hflip,vflip=ul_vflip,name="Mirror")
@@ -185,6 +553,9 @@ def accord_1d(img,layer,n,do_flip,orientation):
 
 def accordion(img, layer, n_horiz, n_vert, do_flip, ul_hflip, ul_vflip):
     '''reflect the image horizontally and/or vertically multiple times'''
+    if npprocess:
+        return reflections(img,"Accordion",max([1,n_horiz]),max([1,n_vert]),
+                           do_flip,ul_hflip,ul_vflip)
     ## first copy visble to base layer and flip if needed
     layer = visible_base(img,hflip=ul_hflip,vflip=ul_vflip,name="Accordion")
 
@@ -225,9 +596,7 @@ def scale_to_fibonacci(img,squareflag):
 
 def rotate_simple(img,layer,quarterturns):
     '''rotate the layer 90 degrees X number of quarter turns'''
-    quarterturns = quarterturns % 4 # so 0 <= q < 4
-    if quarterturns:
-        pdb.plug_in_rotate(img,layer,quarterturns,False)
+    return transform_layer(layer,Transform(turns=quarterturns))
 
 def fibonacci_prev(n):
     g = (math.sqrt(5)+1)/2
@@ -238,6 +607,38 @@ def fibonacci_next(n):
     g = (math.sqrt(5)+1)/2
     return int(round(n*g))
 
+def fibonacci_steps(width,height,sq_flag):
+    '''
+    (count, width, height, x, y) of each copy in a fibonacci spiral
+    of a width x height image (width >= height): its size before it
+    is rotated, and the upper left corner at which it is placed
+    '''
+    steps = []
+    nxtsize = min([width,height])
+    cursize = fibonacci_next(nxtsize)
+    count = 0
+    x = y = 0
+    while cursize > nxtsize:
+        count += 1
+        cursize,nxtsize = nxtsize,cursize-nxtsize
+        new_width = nxtsize if sq_flag else cursize
+        ## Complicated logic to get x,y coordinates of
+        ## UL corner of count'th layer in Fibonacci spiral
+        if count % 4 == 1:
+            x += cursize
+        if count % 4 == 2:
+            y += cursize
+        if sq_flag:
+            if count % 4 == 2:
+                x += cursize-nxtsize
+            if count % 4 == 3:
+                x -= nxtsize
+                y += cursize-nxtsize
+            if count % 4 == 0:
+                y -= nxtsize
+        steps.append((count,new_width,nxtsize,x,y))
+    return steps
+
 def fibonacci_spiral(img,aspect,q_turn,blend,opacity,merge_down):
     '''
     Third attempt at a fibonacci spiral, with new options,
@@ -249,17 +650,20 @@ def fibonacci_spiral(img,aspect,q_turn,blend,opacity,merge_down):
     opacity: opacity for overlapping layers (only in rectangle mode)
     merge_down: if True, then flatten all the layers at the end
     '''
-    portrait_flag = sq_flag = False
+    portrait_mode = sq_flag = False
     if aspect == 1 or img.height == img.width:
         sq_flag = True
         blend = LAYER_MODE_NORMAL
         opacity = 100.
     if img.height > img.width:
         portrait_mode = True
+    ## with numpy, a portrait image is simply read as a turned view
+    ## of it, so the image itself need not be turned there and back
+    to_landscape = Transform(turns=1 if portrait_mode else 0)
+    if portrait_mode and not npprocess:
         pdb.gimp_image_rotate(img,ROTATE_90)
-
-    if img.height > img.width:
-        raise RuntimeError("Failed to rotate portrait mode")
+        if img.height > img.width:
+            raise RuntimeError("Failed to rotate portrait mode")
 
     ## For rectangular aspect, only rotate 90 or 270
     if aspect != 1 and q_turn in [0,2]:
@@ -268,42 +672,56 @@ def fibonacci_spiral(img,aspect,q_turn,blend,opacity,merge_down):
 
     scale_to_fibonacci(img,sq_flag)
     baselayer = visible_base(img,name="Base") ## copy a new layer
-    nxtsize = min([img.width,img.height])
-    cursize = fibonacci_next(nxtsize)
-    count = 0
-    x = y = 0
-    while cursize > nxtsize:
-        count += 1
-        cursize,nxtsize = nxtsize,cursize-nxtsize
-        nxtlayer = baselayer.copy()
-        img.add_layer(nxtlayer,-1)
-        new_width = nxtsize if sq_flag else cursize
-        nxtlayer.scale(new_width,nxtsize,False)
-        rotate_simple(img,nxtlayer,count*q_turn)
-        ## Complicated logic to get x,y coordinates of
-        ## UL corner of count'th layer in Fibonacci spiral
-        if count % 4 == 1:
-            x += cursize
-        if count % 4 == 2:
-            y += cursize
-        if sq_flag:
-            if count % 4 == 2:
-                x += cursize-nxtsize
-            if count % 4 == 3:
-                x -= nxtsize
-                y += cursize-nxtsize
-            if count % 4 == 0:
-                y -= nxtsize
-        nxtlayer.set_offsets(x,y)
-        nxtlayer.mode = blend
-        nxtlayer.opacity = opacity
+    if npprocess:
+        fibonacci_spiral_pyramid(img,baselayer,to_landscape,sq_flag,q_turn,
+                                 blend,opacity,merge_down)
+    else:
+        steps = fibonacci_steps(img.width,img.height,sq_flag)
+        for count,new_width,new_height,x,y in steps:
+            nxtlayer = baselayer.copy()
+            img.add_layer(nxtlayer,-1)
+            nxtlayer.scale(new_width,new_height,False)
+            rotate_simple(img,nxtlayer,count*q_turn)
+            nxtlayer.set_offsets(x,y)
+            nxtlayer.mode = blend
+            nxtlayer.opacity = opacity
     img.resize_to_layers()
     if merge_down:
         img.flatten()
-    if portrait_mode:
+    if portrait_mode and not npprocess:
         ## undo rotation to get image back into portrait aspect
         pdb.gimp_image_rotate(img,ROTATE_270)
 
+def fibonacci_spiral_pyramid(img,baselayer,to_landscape,sq_flag,q_turn,
+                             blend,opacity,merge_down):
+    '''
+    the copies of fibonacci_spiral, each drawn from the nearest level of
+    a pyramid of baselayer, rather than from a full-size copy of it; the
+    tiniest ones share a single tail layer.  When the copies are going
+    to be flattened anyway, and simply cover each other (Normal mode,
+    full opacity, no transparency), they are all drawn straight into
+    baselayer instead.  The spiral is laid out on baselayer as seen
+    through to_landscape, and everything is turned back (as array views)
+    on the way out.
+    '''
+    arr = to_landscape.array(pixels.read(baselayer))
+    h,w = arr.shape[:2]
+    steps = fibonacci_steps(w,h,sq_flag)
+    back = to_landscape.inverse()
+    if (merge_down and blend == LAYER_MODE_NORMAL and opacity == 100
+        and npprocess.is_opaque(arr,baselayer.has_alpha)):
+        ## opaque copies just cover each other
+        canvas,x0,y0 = npprocess.spiral_canvas(arr,steps,q_turn)
+        x,y,cw,ch = back.rect(x0,y0,canvas.shape[1],canvas.shape[0],w,h)
+        baselayer.resize(cw,ch,-x,-y)
+        baselayer.set_offsets(x,y)
+        pixels.write(baselayer,back.array(canvas))
+        return
+    for name,tile,x0,y0 in npprocess.spiral_tiles(arr,steps,q_turn):
+        x,y,tw,th = back.rect(x0,y0,tile.shape[1],tile.shape[0],w,h)
+        layer = img.new_layer(name,tw,th,x,y,opacity=opacity,mode=blend)
+        pixels.write(layer,back.array(tile))
+
 def fuzzy_select(img,layer,threshold,xlist,ylist):
     ## set threshold
     thresh_orig = pdb.gimp_context_get_sample_threshold_int()
@@ -318,8 +736,23 @@ def fuzzy_select(img,layer,threshold,xlist,ylist):
     pdb.gimp_context_set_sample_threshold_int(thresh_orig)
 
 def jagged_border(img,layer,border_shape,border_white,border_size,
-                  thresh,fill_islands,one_pixel_border):
-    if border_shape == 0:
+                  thresh,fill_islands,one_pixel_border,preview=False):
+    '''
+    a border layer that follows the image, from its jagged outline;
+    with preview, on a proxy, with the border width scaled down
+    '''
+    if preview:
+        return run_preview(img,lambda proxy,base,f:
+                           jagged_border(proxy,base,border_shape,border_white,
+                                         max([1,int(round(border_size/f))]),
+                                         thresh,fill_islands,
+                                         one_pixel_border))
+    if border_shape == 0 and npprocess and pdb.gimp_selection_is_empty(img):
+        ## numpy does both directions in one run, from one visible copy,
+        ## and makes a single border layer
+        jagged_border_run(img,layer,border_shape,border_white,border_size,
+                          thresh,fill_islands,one_pixel_border)
+    elif border_shape == 0:
         ## For rectangular border, to avoid rounded corners,
         ## run twice: once horizontal-only, and once vertical-only
         jagged_border_run(img,layer,1,border_white,border_size,
@@ -339,6 +772,29 @@ def jagged_border(img,layer,border_shape,border_white,border_size,
 
 def jagged_border_run(img,layer,border_shape,border_white,border_size,
                   thresh,fill_islands,one_pixel_border):
+    if npprocess and pdb.gimp_selection_is_empty(img):
+        ## the fuzzy selects are flood fills on an array, so the border
+        ## mask is computed without any selections or temporary layers
+        bdr_layer = visible_base(img,name="Border")
+        arr = pixels.read(bdr_layer)
+        if npprocess.BORDER_MAP_DIR:
+            ## a map of all thresholds, so trying another one is instant
+            mask = npprocess.border_map(arr,border_shape,border_white,
+                                        border_size,one_pixel_border,
+                                        bdr_layer.has_alpha).mask(thresh,
+                                                                  fill_islands)
+        else:
+            mask = npprocess.jagged_border_mask(arr,border_shape,border_white,
+                                                border_size,thresh,fill_islands,
+                                                one_pixel_border,
+                                                bdr_layer.has_alpha)
+        pixels.write(bdr_layer,npprocess.border_layer(mask,border_white,
+                                                      bdr_layer.bpp,
+                                                      bdr_layer.has_alpha))
+        bdr_layer.mode = (LAYER_MODE_ADDITION if border_white
+                          else LAYER_MODE_MULTIPLY)
+        return bdr_layer
+
     ## add two new layers
     tmp_layer = visible_base(img,name="tmp")
     cpy_layer = visible_base(img,name="border")
@@ -370,7 +826,14 @@ def jagged_border_run(img,layer,border_shape,border_white,border_size,
     pdb.gimp_selection_invert(img)
     pdb.gimp_edit_fill(tmp_layer,WHITE_FILL)
     pdb.gimp_selection_none(img)
-    wide_blur(img,tmp_layer,2*border_size)
+    ## the middle stays black, so only the frame needs blurring
+    inner = (xlo,ylo,xhi-xlo,yhi-ylo)
+    if border_shape == 3:
+        inner = None
+        if npprocess:
+            y0,y1,x0,x1 = npprocess.ellipse_inner_rect(ylo,yhi,xlo,xhi)
+            inner = (x0,y0,x1-x0,y1-y0)
+    wide_blur(img,tmp_layer,2*border_size,inner=inner)
 
     pdb.gimp_drawable_desaturate(cpy_layer,DESATURATE_LIGHTNESS)
     if not border_white:
@@ -410,12 +873,32 @@ def jagged_border_run(img,layer,border_shape,border_white,border_size,
         pdb.gimp_invert(bdr_layer)
         bdr_layer.mode = LAYER_MODE_MULTIPLY
 
-def pan_to_bow(img,angle_degrees,arc_up=True):
+## without numpy, the bow is cut from a full circle padded out to
+## 360/angle times the image width: smaller angles need too much memory
+PDB_BOW_MIN_DEGREES = 45
+
+def pan_to_bow(img,angle_degrees,arc_up=True,post=None):
+    '''
+    bend a panorama into a bow; post is an optional Transform
+    for the finished bow, applied along with its own final flip.
+    Without numpy, angles under PDB_BOW_MIN_DEGREES are raised to it.
+    '''
     ## Using a new layer from visible, we obtain transparent background
 
     ## since background is going to be transparent, make bottom layer invisible
     ## so it doesn't show through
     bottom_layer = img.active_layer
+    if remap:
+        layer = visible_base(img,name="PanToBow")
+        if bottom_layer:
+            bottom_layer.visible=False
+        return pan_to_bow_direct(img,layer,angle_degrees,arc_up,post)
+    if angle_degrees < PDB_BOW_MIN_DEGREES:
+        pdb.gimp_message('Pan to Bow: without numpy, the angle must be at '
+                         'least %d degrees; using %d instead of %g'
+                         % (PDB_BOW_MIN_DEGREES,PDB_BOW_MIN_DEGREES,
+                            angle_degrees))
+        angle_degrees = PDB_BOW_MIN_DEGREES
     layer = visible_base(img,vflip=bool(arc_up),name="PanToBow")
     if bottom_layer:
         bottom_layer.visible=False
@@ -479,13 +962,36 @@ def pan_to_bow(img,angle_degrees,arc_up=True):
         ## offset is in width
         img.crop(w_crop,h_crop,(img.width - w_crop)//2,0)
 
-    if arc_up:
-        layer = flip_v(layer)
+    ## flip back, and then whatever post does, in one go
+    xform = Transform(vflip=bool(arc_up))
+    if post:
+        xform.then(post)
+    return transform_layer(layer,xform)
 
+def pan_to_bow_direct(img,layer,angle_degrees,arc_up=True,post=None):
+    '''
+    pan_to_bow by inverse mapping: each output pixel is interpolated
+    from the source, with no padded full circle in between
+    '''
+    arr = remap.pan_to_bow(pixels.read(layer),angle_degrees,bool(arc_up),
+                           layer.has_alpha)
+    if post:
+        arr = post.array(arr)
+    h,w = arr.shape[:2]
+    img.resize(w,h,0,0)
+    if not layer.has_alpha:
+        layer.add_alpha()
+    layer.resize(w,h,0,0)
+    layer.set_offsets(post.dx if post else 0,post.dy if post else 0)
+    pixels.write(layer,arr)
     return layer
 
-def infinity(img,bkg_color,pad_degrees=0,vfix=0):
-    '''bend a high-aspect ratio image into a horizontal figure-eight'''
+def infinity(img,bkg_color,pad_degrees=0,vfix=0,one_layer=False):
+    '''
+    bend a high-aspect ratio image into a horizontal figure-eight;
+    with one_layer, the whole figure and its background are rendered
+    in a single pass into a single layer, so there are no seams
+    '''
     pad = pad_degrees/(720-2*pad_degrees)
     if pad > 0:
         pixpad = int(pad*img.width)
@@ -500,23 +1006,23 @@ def infinity(img,bkg_color,pad_degrees=0,vfix=0):
     main_layer = visible_base(img,name="InfinityBase")
     h = main_layer.height
     w = main_layer.width
-    aux_layers = []
-    for k in range(4):
-        ## Put 1/4 of the image into an aux image
-        img_aux = gimp.Image(img.width,img.height,RGB)
-        layer = pdb.gimp_layer_new_from_drawable(main_layer, img_aux)
-        img_aux.add_layer(layer)
-        img_aux.crop(w//4,h,k*w//4,0)
-        ## Make a rainbow or smile
-        rainbow = bool(k in [2,3])
-        layer = pan_to_bow(img_aux,180,rainbow)
-        ## orient as needed
-        if k in [0,3]:
-            layer = flip(layer,True,True)
-        ## add rainbow layer back to original image
-        layer_new = pdb.gimp_layer_new_from_drawable(layer, img)
-        img.add_layer(layer_new)
-        aux_layers.append(layer_new)
+    if remap and one_layer:
+        arr = remap.infinity(pixels.read(main_layer),color_to_rgb(bkg_color),
+                             vfix,main_layer.has_alpha)
+        img.resize(arr.shape[1],arr.shape[0],0,0)
+        layer = img.new_layer("Infinity",arr.shape[1],arr.shape[0])
+        pixels.write(layer,arr)
+        return layer
+    if remap:
+        ## render the four bows at once, straight into new layers
+        aux_layers = []
+        for bow in remap.infinity_bows(pixels.read(main_layer),
+                                       main_layer.has_alpha):
+            layer_new = img.new_layer("PanToBow",bow.shape[1],bow.shape[0])
+            pixels.write(layer_new,bow)
+            aux_layers.append(layer_new)
+    else:
+        aux_layers = infinity_bows_pdb(img,main_layer)
 
     W = aux_layers[0].width
     H = aux_layers[0].height
@@ -537,24 +1043,67 @@ def infinity(img,bkg_color,pad_degrees=0,vfix=0):
     layer_fill_color(tmp_layer,bkg_color)
     img.lower_layer(tmp_layer)
 
+def infinity_bows_pdb(img,main_layer):
+    '''the four bows of infinity, made one by one in auxiliary images'''
+    h = main_layer.height
+    w = main_layer.width
+    aux_layers = []
+    for k in range(4):
+        ## Put 1/4 of the image into an aux image
+        img_aux = gimp.Image(img.width,img.height,RGB)
+        layer = pdb.gimp_layer_new_from_drawable(main_layer, img_aux)
+        img_aux.add_layer(layer)
+        img_aux.crop(w//4,h,k*w//4,0)
+        ## Make a rainbow or smile, oriented as needed
+        rainbow = bool(k in [2,3])
+        layer = pan_to_bow(img_aux,180,rainbow,
+                           Transform(True,True) if k in [0,3] else None)
+        ## add rainbow layer back to original image
+        layer_new = pdb.gimp_layer_new_from_drawable(layer, img)
+        img.add_layer(layer_new)
+        aux_layers.append(layer_new)
+    return aux_layers
+
 ############################
 ## Define the 'undo' context
 
 class UndoContext:
-    '''code within this context has an Undo associated with it'''
+    '''
+    code within this context has an Undo associated with it;
+    since every plug-in runs in one, this is also where numpy is loaded
+    '''
+    ## image ID -> what to do once its undo group has ended
+    pending = {}
+
     def __init__(self,img):
         self.img=img
 
     def __enter__(self):
+        load_numpy()
         pdb.gimp_undo_push_group_start(self.img)
+        ## a context within another for the same image leaves it to that one
+        self.outer = self.img.ID not in UndoContext.pending
+        if self.outer:
+            UndoContext.pending[self.img.ID] = []
         return None
 
     def __exit__(self, exc_type, exc_value, exc_tb):
         if exc_type:
             print('exc:',exc_type,exc_value,exc_tb)
         pdb.gimp_undo_push_group_end(self.img)
+        if self.outer:
+            for action in UndoContext.pending.pop(self.img.ID):
+                action()
         return True
 
+    @staticmethod
+    def after(img,action):
+        '''action(), outside img's undo group: when it ends, or now if none'''
+        if img.ID in UndoContext.pending:
+            UndoContext.pending[img.ID].append(action)
+        else:
+            action()
+
 ##################################
 ## Wrapper for register() function
 
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# Time how long the GIMP takes to query these plug-ins at startup
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License at http://www.gnu.org/licenses for
+# more details.
+
+from __future__ import print_function, division
+
+DESCRIPTION='''
+Starts the GIMP without a GUI, with a throwaway profile, once with the
+single-procedure plug-ins installed (wideblur.py, cheaphdr.py, ...) and
+once with theilr.py installed instead, and reports the startup time of
+each.  Before every start the plug-in files are touched, so the GIMP
+queries them all again, as it does after they are installed or changed;
+the query time is the difference from a start where they are not
+installed at all.
+'''
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+## plug-ins that each register one procedure
+SINGLES = ['accordion.py','cheaphdr.py','fibonaccispiral.py','infinity.py',
+           'jaggedborder.py','mirror.py','pantobow.py','quickenhance.py',
+           'scalefibonacci.py','scalelayertoimage.py','vignette.py',
+           'wideblur.py','wrapdaub.py']
+## modules they import, which are not plug-ins themselves
+SUPPORT = ['procedures.py','process.py','transform.py','pixels.py',
+           'fastblur.py','tiles.py','npprocess.py','floodfill.py','remap.py',
+           'arraycache.py','imagestats.py']
+
+LAYOUTS = [('none',[]),('singles',SINGLES),('theilr',['theilr.py'])]
+
+def install(plugin_dir,plugins):
+    '''copy the plug-ins (executable) and their support modules'''
+    for name in plugins + (SUPPORT if plugins else []):
+        dst = os.path.join(plugin_dir,name)
+        shutil.copy(os.path.join(HERE,name),dst)
+        if name in plugins:
+            os.chmod(dst,0o755)
+
+def start_gimp(gimp,profile,plugin_dir):
+    '''seconds for one start (and quit) of the GIMP, plug-ins re-queried'''
+    now = time.time()
+    for name in os.listdir(plugin_dir):
+        os.utime(os.path.join(plugin_dir,name),(now,now))
+    env = dict(os.environ,GIMP2_DIRECTORY=profile)
+    with open(os.devnull,'w') as devnull:
+        t0 = time.time()
+        subprocess.check_call([gimp,'-i','-d','-f','-b','(gimp-quit 0)'],
+                              env=env,stdout=devnull,stderr=devnull)
+        return time.time()-t0
+
+def time_layout(gimp,plugins,runs):
+    '''median startup time, with a fresh profile holding these plug-ins'''
+    profile = tempfile.mkdtemp(prefix='querytime-')
+    try:
+        plugin_dir = os.path.join(profile,'plug-ins')
+        os.makedirs(plugin_dir)
+        with open(os.path.join(profile,'gimprc'),'w') as fp:
+            fp.write('(plug-in-path "%s:${gimp_plug_in_dir}/plug-ins")\n'
+                     % plugin_dir)
+        install(plugin_dir,plugins)
+        start_gimp(gimp,profile,plugin_dir) ## first start sets up profile
+        times = sorted(start_gimp(gimp,profile,plugin_dir)
+                       for _ in range(runs))
+        return times[len(times)//2]
+    finally:
+        shutil.rmtree(profile)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=DESCRIPTION,
+                    formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gimp',default='gimp',
+                        help='GIMP executable (default: gimp)')
+    parser.add_argument('-n','--runs',type=int,default=5,
+                        help='starts per layout; the median is reported')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    base = None
+    for layout,plugins in LAYOUTS:
+        t = time_layout(args.gimp,plugins,args.runs)
+        if base is None:
+            base = t
+            print('%-8s %6.2f s' % (layout,t))
+        else:
+            print('%-8s %6.2f s  (query: %.2f s)' % (layout,t,t-base))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
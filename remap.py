@@ -0,0 +1,367 @@
+'''Geometric remapping (pan to bow) by inverse mapping, with numpy'''
+
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License at http://www.gnu.org/licenses for
+# more details.
+
+## Rather than pad the image out to a full circle and run polar coords
+## on it (as process.pan_to_bow does with the pdb), work backwards: for
+## each pixel of the output, find where in the source it comes from,
+## and interpolate there.  Memory is just the input plus the output,
+## so any angle from 1 to 360 degrees is practical.
+
+from __future__ import print_function, division
+import math
+import os
+from collections import OrderedDict
+import numpy as np
+import arraycache
+import tiles
+from transform import Transform
+
+## to keep remapping tables across runs (eg, for a series of panoramas
+## of the same size), set this to a directory, eg
+## os.path.expanduser('~/.cache/gimp-frastructure')
+CACHE_DIR = None
+## ...where the least recently used are deleted beyond this many bytes
+CACHE_DISK_BYTES = 2*2**30
+
+## in-memory budget for remapping tables (16 bytes per output pixel)
+CACHE_BYTES = 512*2**20
+
+class BowGeometry:
+    '''
+    sizes and radii of the bow made from a w_o x h_o image;
+    these follow the pdb version of pan_to_bow
+    '''
+    def __init__(self,w_o,h_o,angle_degrees):
+        self.w_o = w_o
+        self.h_o = h_o
+        self.angle = angle_degrees * math.pi / 180.
+        ## scale is preserved along the middle of the image
+        bow_radius = int( w_o / self.angle )
+        self.r_inner = max([0, bow_radius - h_o//2])
+        self.r_outer = self.r_inner + h_o
+        sinx = abs(math.sin(self.angle/2))
+        cosx = abs(math.cos(self.angle/2))
+        if angle_degrees < 180:
+            self.width = int( 2*self.r_outer*sinx )
+            self.height = int( self.r_outer - self.r_inner*cosx )
+        else:
+            self.width = int( 2*self.r_outer )
+            self.height = int( (1+cosx)*self.r_outer )
+        self.width = max([1,self.width])
+        self.height = max([1,self.height])
+
+    def source_coords(self,y0,y1,x0,x1):
+        '''
+        source (x,y) of output pixels y0:y1, x0:x1, in pixel units with
+        pixel centers at integers; pixels off the bow get x = y = -1
+        '''
+        ## output pixel centers, relative to the center of the circle,
+        ## which sits r_outer below the top edge, in the middle
+        dx = np.arange(x0,x1,dtype=np.float64) + 0.5 - self.width/2
+        dy = self.r_outer - (np.arange(y0,y1,dtype=np.float64) + 0.5)
+        dx,dy = np.meshgrid(dx,dy)
+        ## angle from twelve o'clock, clockwise, and radius
+        phi = np.arctan2(dx,dy)
+        r = np.hypot(dx,dy)
+        xs = (phi/self.angle + 0.5)*self.w_o - 0.5
+        ys = (self.r_outer - r) - 0.5
+        off = ((xs < -0.5) | (xs > self.w_o-0.5) |
+               (ys < -0.5) | (ys > self.h_o-0.5))
+        xs[off] = -1
+        ys[off] = -1
+        return xs.astype(np.float32),ys.astype(np.float32)
+
+class RemapTable:
+    '''
+    precomputed bilinear lookup for a remapping: for each output pixel,
+    the upper-left source pixel (x0,y0) and the weights (fx,fy) of the
+    pixels to its right and below; x0 = -1 marks pixels with no source
+    '''
+    def __init__(self,x0,y0,fx,fy):
+        self.x0,self.y0,self.fx,self.fy = x0,y0,fx,fy
+
+    @classmethod
+    def from_coords(cls,xs,ys,w,h):
+        '''table for sampling a w x h source at (xs,ys); -1 marks off'''
+        off = xs == -1
+        xs = np.clip(xs,0,w-1)
+        ys = np.clip(ys,0,h-1)
+        x0 = np.minimum(xs.astype(np.int32),max([w-2,0]))
+        y0 = np.minimum(ys.astype(np.int32),max([h-2,0]))
+        fx = (xs - x0).astype(np.float32)
+        fy = (ys - y0).astype(np.float32)
+        x0[off] = -1
+        return cls(x0,y0,fx,fy)
+
+    @property
+    def shape(self):
+        return self.x0.shape
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.x0,self.y0,self.fx,self.fy))
+
+    def window(self,y0,y1,x0,x1):
+        '''the part of the table for output pixels y0:y1, x0:x1'''
+        return RemapTable(*[a[y0:y1,x0:x1]
+                            for a in (self.x0,self.y0,self.fx,self.fy)])
+
+    def save(self,path):
+        '''write to an .npz file (atomically, via a temporary file)'''
+        tmp = path + '.tmp.npz'
+        np.savez(tmp,x0=self.x0,y0=self.y0,fx=self.fx,fy=self.fy)
+        os.rename(tmp,path)
+
+    @classmethod
+    def load(cls,path):
+        with np.load(path) as npz:
+            return cls(npz['x0'],npz['y0'],npz['fx'],npz['fy'])
+
+def gather(src,table):
+    '''
+    bilinear interpolation of src (h,w,channels, with alpha last) by a
+    RemapTable; colors are interpolated premultiplied, and pixels with
+    no source come back fully transparent
+    '''
+    h,w = src.shape[:2]
+    off = table.x0 < 0
+    x0 = np.where(off,0,table.x0)
+    y0 = table.y0
+    x1 = np.minimum(x0+1,w-1)
+    y1 = np.minimum(y0+1,h-1)
+    fx = table.fx[...,None]
+    fy = table.fy[...,None]
+    def corner(y,x):
+        pix = src[y,x].astype(np.float32)
+        pix[...,:-1] *= pix[...,-1:]/255
+        return pix
+    top = corner(y0,x0)*(1-fx) + corner(y0,x1)*fx
+    bot = corner(y1,x0)*(1-fx) + corner(y1,x1)*fx
+    out = top*(1-fy) + bot*fy
+    alpha = out[...,-1:]
+    np.divide(out[...,:-1]*255,alpha,out=out[...,:-1],where=alpha>0)
+    out[off] = 0
+    return out
+
+def remap(src,table,workers=None):
+    '''apply a RemapTable to src, tile by tile'''
+    h,w = table.shape
+    return tiles.fill_tiles(lambda y0,y1,x0,x1:
+                            gather(src,table.window(y0,y1,x0,x1)),
+                            h,w,workers=workers)
+
+#################################
+## LRU cache of remapping tables
+
+class TableCache:
+    '''
+    remapping tables by key, least recently used dropped first once
+    max_bytes is exceeded (a table larger than max_bytes is not kept in
+    memory at all); if disk_dir is set, tables are also saved
+    there, and looked for there before being computed again; there too,
+    the least recently used are deleted once they take up more than
+    disk_bytes (if that is set)
+    '''
+    def __init__(self,max_bytes,disk_dir=None,disk_bytes=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self.tables = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.disk_hits = self.misses = 0
+
+    def path(self,key):
+        name = 'remap_' + '_'.join(str(k) for k in key) + '.npz'
+        return os.path.join(self.disk_dir,name)
+
+    def get(self,key,compute):
+        '''the table for key, from memory, disk, or else compute()'''
+        if key in self.tables:
+            self.hits += 1
+            table = self.tables.pop(key)
+        elif self.disk_dir and os.path.exists(self.path(key)):
+            self.disk_hits += 1
+            arraycache.touch(self.path(key))
+            table = RemapTable.load(self.path(key))
+            self.nbytes += table.nbytes
+        else:
+            self.misses += 1
+            table = compute()
+            self.nbytes += table.nbytes
+            if self.disk_dir:
+                if not os.path.isdir(self.disk_dir):
+                    os.makedirs(self.disk_dir)
+                table.save(self.path(key))
+                if self.disk_bytes is not None:
+                    arraycache.prune_dir(self.disk_dir,'remap',
+                                         self.disk_bytes)
+        if table.nbytes > self.max_bytes:
+            ## too big to keep, even alone (the disk may have it)
+            self.nbytes -= table.nbytes
+            return table
+        self.tables[key] = table
+        ## drop least recently used
+        while self.nbytes > self.max_bytes:
+            _,old = self.tables.popitem(last=False)
+            self.nbytes -= old.nbytes
+        return table
+
+    def clear(self):
+        self.tables.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return dict(hits=self.hits,disk_hits=self.disk_hits,
+                    misses=self.misses,entries=len(self.tables),
+                    nbytes=self.nbytes)
+
+## shared by pan_to_bow (and so by infinity, which makes four equal bows)
+CACHE = TableCache(CACHE_BYTES,CACHE_DIR,CACHE_DISK_BYTES)
+
+def cached_table(key,compute):
+    '''compute(), or the table it gave before for the same key'''
+    ## the settings may have been changed since the module was loaded
+    CACHE.max_bytes,CACHE.disk_dir = CACHE_BYTES,CACHE_DIR
+    CACHE.disk_bytes = CACHE_DISK_BYTES
+    return CACHE.get(key,compute)
+
+def cache_stats():
+    '''hits (in memory, on disk) and misses of the remapping table cache'''
+    return CACHE.stats()
+
+###########################
+## Remapping functions
+
+def bow_table(w_o,h_o,angle_degrees,arc_up=False):
+    '''
+    (cached) table that bends a w_o x h_o image into a bow; with arc_up,
+    the source and the result are both flipped vertically
+    '''
+    def compute():
+        geom = BowGeometry(w_o,h_o,angle_degrees)
+        coords = tiles.fill_tiles(lambda y0,y1,x0,x1:
+                                  np.dstack(geom.source_coords(y0,y1,x0,x1)),
+                                  geom.height,geom.width)
+        xs,ys = coords[...,0],coords[...,1]
+        if arc_up:
+            xs,ys = xs[::-1],ys[::-1]
+            ys = np.where(xs == -1,ys,(h_o-1) - ys)
+        return RemapTable.from_coords(xs,ys,w_o,h_o)
+    key = (w_o,h_o,float(angle_degrees),bool(arc_up))
+    return cached_table(key,compute)
+
+def with_alpha(arr,has_alpha):
+    '''arr, with an opaque alpha channel appended if it has none'''
+    if has_alpha:
+        return arr
+    alpha = np.full(arr.shape[:2]+(1,),255,dtype=arr.dtype)
+    return np.concatenate([arr,alpha],axis=2)
+
+def pan_to_bow(src,angle_degrees,arc_up=False,has_alpha=True):
+    '''
+    bend a (h,w,channels) panorama into a bow of angle_degrees; returns
+    a float32 (height,width,channels) array that always has alpha.
+    As in process.pan_to_bow, arc_up flips the source before bending
+    and flips the result back afterwards.  The (trigonometric) part
+    that depends only on size and angle is cached; see bow_table.
+    '''
+    src = with_alpha(src,has_alpha)
+    return remap(src,bow_table(src.shape[1],src.shape[0],
+                               angle_degrees,arc_up))
+
+def infinity_bows(src,has_alpha=True,workers=None):
+    '''
+    the four 180-degree bows that process.infinity puts together, one
+    from each quarter of src, rendered concurrently; returns a list of
+    four float32 arrays, oriented and ready to be placed
+    '''
+    src = with_alpha(src,has_alpha)
+    h,w = src.shape[:2]
+    q = w//4
+    ## all four quarters have the same size, so they share two tables
+    ## (rainbow and smile), computed up front rather than in the workers
+    tables = dict((arc_up,bow_table(q,h,180,arc_up))
+                  for arc_up in (False,True))
+    ## flipped both ways, as process.infinity does for two of them
+    orient = [Transform(k in (0,3),k in (0,3)) for k in range(4)]
+    def render(k):
+        bow = remap(src[:,k*q:(k+1)*q],tables[k in (2,3)],workers=1)
+        return orient[k].array(bow)
+    return tiles.run(render,list(range(4)),workers)
+
+def over(top,bottom):
+    '''top composited over bottom (normal mode), alpha last, 0-255 values'''
+    a_top = top[...,-1:]/255
+    a_bot = bottom[...,-1:]/255
+    alpha = a_top + a_bot*(1-a_top)
+    out = np.empty_like(bottom)
+    out[...,:-1] = top[...,:-1]*a_top + bottom[...,:-1]*a_bot*(1-a_top)
+    np.divide(out[...,:-1],alpha,out=out[...,:-1],where=alpha>0)
+    out[...,-1:] = 255*alpha
+    return out
+
+def infinity(src,bkg,vfix=0,has_alpha=True):
+    '''
+    the whole figure-eight of process.infinity in one pass: every pixel
+    of the final canvas is mapped straight back into src, or else gets
+    the background color bkg (0-255 values, one per color channel).
+    The four half-circles overlap just as the layers of process.infinity
+    do; vfix shifts the upper halves down and the lower halves up.
+    '''
+    src = with_alpha(src,has_alpha)
+    h,w = src.shape[:2]
+    q = w//4
+    geom = BowGeometry(q,h,180)
+    W,H = geom.width,geom.height
+    r_outer = geom.r_outer
+    ## (quarter, x offset, y offset, flip x, flip y, flip source) for the
+    ## four half-circles, from the bottom of the stack to the top
+    pieces = [(3, W-h, vfix,   True,  False, True),
+              (0, 0,   H-vfix, True,  True,  False),
+              (1, 0,   vfix,   False, False, False),
+              (2, W-h, H-vfix, False, True,  True)]
+    bkg = list(bkg)
+    if src.shape[2] == 2 and len(bkg) > 1:
+        bkg = [sum(bkg)/len(bkg)]
+    background = np.append(np.asarray(bkg,dtype=np.float32),255)
+
+    def kernel(y0,y1,x0,x1):
+        out = np.empty((y1-y0,x1-x0,src.shape[2]),dtype=np.float32)
+        out[...] = background
+        for k,ox,oy,flip_x,flip_y,flip_src in pieces:
+            ## the part of this tile that the half-circle could cover
+            ya,yb = max([y0,oy]),min([y1,oy+H])
+            xa,xb = max([x0,ox]),min([x1,ox+W])
+            if ya >= yb or xa >= xb:
+                continue
+            ## pixel centers in the (unflipped) bow's own coordinates
+            u = np.arange(xa,xb,dtype=np.float64) + 0.5 - ox
+            v = np.arange(ya,yb,dtype=np.float64) + 0.5 - oy
+            u = W - u if flip_x else u
+            v = H - v if flip_y else v
+            dx,dy = np.meshgrid(u - r_outer,r_outer - v)
+            xs = (np.arctan2(dx,dy)/math.pi + 0.5)*q - 0.5
+            ys = (r_outer - np.hypot(dx,dy)) - 0.5
+            on = (xs >= -0.5) & (xs <= q-0.5) & (ys >= -0.5) & (ys <= h-0.5)
+            if not on.any():
+                continue
+            ## neighbouring quarters are read across the joins: no seams
+            xs = xs[on] + k*q
+            ys = (h-1) - ys[on] if flip_src else ys[on]
+            table = RemapTable.from_coords(xs.astype(np.float32),
+                                           ys.astype(np.float32),w,h)
+            window = out[ya-y0:yb-y0,xa-x0:xb-x0]
+            window[on] = over(gather(src,table),window[on])
+        return out
+
+    return tiles.fill_tiles(kernel,2*H,2*W-h)
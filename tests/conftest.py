@@ -0,0 +1,7 @@
+## the modules under test sit at the top of the repository, as they do
+## in the GIMP's plug-ins directory; only those that need neither gimpfu
+## nor the GIMP itself are tested here
+import os
+import sys
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
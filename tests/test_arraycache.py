@@ -0,0 +1,97 @@
+'''the array cache: its memory bound, its disk tier, and pruning'''
+
+from __future__ import print_function, division
+import os
+import time
+import numpy as np
+import pytest
+
+import arraycache
+
+def block(n,value=0):
+    '''n bytes of float32'''
+    return np.full(n//4,value,dtype=np.float32)
+
+def test_checksum_is_of_shape_dtype_and_bytes():
+    arr = np.arange(12,dtype=np.uint8)
+    assert arraycache.checksum(arr) == arraycache.checksum(arr.copy())
+    assert arraycache.checksum(arr) != arraycache.checksum(arr.reshape(3,4))
+    assert arraycache.checksum(arr) != arraycache.checksum(arr.astype(np.int8))
+    assert (arraycache.checksum(arr.reshape(3,4).T) ==
+            arraycache.checksum(np.ascontiguousarray(arr.reshape(3,4).T)))
+
+def test_least_recently_used_go_first():
+    cache = arraycache.ArrayCache(3000)
+    for key in 'abacd':
+        cache.get(key,lambda: block(1000))
+    assert list(cache.entries) == ['a','c','d']
+    assert cache.nbytes == 3000
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 4
+
+def test_entries_are_read_only_and_kept_as_tuples():
+    cache = arraycache.ArrayCache(10**6)
+    arrs = cache.get('k',lambda: (block(8),block(16)))
+    assert len(arrs) == 2
+    with pytest.raises(ValueError):
+        arrs[0][0] = 1
+    assert cache.get('k',lambda: None) is arrs
+
+def test_too_big_is_not_kept():
+    cache = arraycache.ArrayCache(1000)
+    cache.get('small',lambda: block(800))
+    big = cache.get('big',lambda: block(4*2**20))
+    assert big[0].nbytes == 4*2**20
+    assert list(cache.entries) == ['small'] and cache.nbytes == 800
+    cache.get('big',lambda: block(4*2**20))
+    assert cache.stats()['misses'] == 3
+
+def test_disk_round_trip(tmp_path):
+    disk = str(tmp_path)
+    arrs = (np.arange(20,dtype=np.float32).reshape(4,5),np.ones(3,np.uint8))
+    cache = arraycache.ArrayCache(10**6,disk,'blur')
+    cache.get(('key',1),lambda: arrs)
+    assert sorted(os.listdir(disk))[0].startswith('blur_')
+    fresh = arraycache.ArrayCache(10**6,disk,'blur')
+    def fail():
+        raise AssertionError('should come from disk')
+    loaded = fresh.get(('key',1),fail)
+    assert fresh.stats()['disk_hits'] == 1
+    for a,b in zip(arrs,loaded):
+        assert a.dtype == b.dtype and np.array_equal(a,b)
+
+def test_too_big_for_memory_still_goes_to_disk(tmp_path):
+    cache = arraycache.ArrayCache(100,str(tmp_path),'blur')
+    cache.get('big',lambda: block(4000))
+    assert not cache.entries
+    cache.get('big',lambda: block(4000))
+    assert cache.stats()['disk_hits'] == 1
+
+def write(path,nbytes,age):
+    with open(path,'wb') as fp:
+        fp.write(b'\0'*nbytes)
+    t = time.time() - age
+    os.utime(path,(t,t))
+
+def test_prune_dir_keeps_the_most_recent(tmp_path):
+    disk = str(tmp_path)
+    for name,age in (('blur_a',30),('blur_b',20),('blur_c',10),
+                     ('remap_d',40),('blur_e.tmp.npy',50)):
+        write(os.path.join(disk,name),100,age)
+    arraycache.prune_dir(disk,'blur',200)
+    ## other prefixes, and temporary files, are left alone
+    assert sorted(os.listdir(disk)) == ['blur_b','blur_c','blur_e.tmp.npy',
+                                        'remap_d']
+    arraycache.touch(os.path.join(disk,'blur_b'))
+    arraycache.prune_dir(disk,'blur',100)
+    assert 'blur_b' in os.listdir(disk) and 'blur_c' not in os.listdir(disk)
+
+def test_prune_dir_deletes_groups_together_and_keeps_the_newest(tmp_path):
+    disk = str(tmp_path)
+    for name,age in (('blur_x_0.npy',30),('blur_x_1.npy',30),
+                     ('blur_y_0.npy',10)):
+        write(os.path.join(disk,name),100,age)
+    group = lambda name: name.rsplit('_',1)[0]
+    arraycache.prune_dir(disk,'blur',150,group)
+    assert os.listdir(disk) == ['blur_y_0.npy']
+    arraycache.prune_dir(disk,'blur',0,group)
+    assert os.listdir(disk) == ['blur_y_0.npy']
@@ -0,0 +1,67 @@
+'''batchenhance: where results go, and that they are the fused engine's'''
+
+from __future__ import print_function, division
+import os
+import numpy as np
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+import batchenhance
+import fastblur
+import npprocess
+
+def save(path,seed=0):
+    arr = np.random.RandomState(seed).randint(0,256,(24,32,3))
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    Image.fromarray(arr.astype(np.uint8)).save(path)
+    return path
+
+def run(*argv):
+    return batchenhance.main(list(argv) + ['-j','1','--r_hdr','40',
+                                           '--s_hdr','0','--r_sharp','2'])
+
+def test_same_names_in_different_directories(tmp_path):
+    a = save(str(tmp_path/'in'/'a'/'x.png'),1)
+    b = save(str(tmp_path/'in'/'b'/'x.png'),2)
+    out = str(tmp_path/'out')
+    assert run(a,b,'-o',out) == 0
+    for src in (a,b):
+        dst = os.path.join(out,os.path.basename(os.path.dirname(src)),'x.png')
+        result = np.asarray(Image.open(dst))
+        arr = np.asarray(Image.open(src))
+        expected, = npprocess.quick_enhance(arr,fastblur.wide_blur_sigma(40),
+                                            0,0.5,2,'darken',0.5)
+        assert np.abs(result - np.rint(expected)).max() <= 1
+
+def test_names_that_still_collide_get_a_suffix(tmp_path):
+    files = [str(tmp_path/'x.png'),str(tmp_path/'x.bmp'),
+             str(tmp_path/'y.png')]
+    outputs = batchenhance.output_paths(files,'out','.png')
+    assert outputs == [os.path.join('out','x.png'),
+                       os.path.join('out','x-2.png'),
+                       os.path.join('out','y.png')]
+
+def test_each_file_once(tmp_path):
+    src = save(str(tmp_path/'x.png'))
+    assert batchenhance.find_images([src,str(tmp_path),
+                                     str(tmp_path/'*.png')]) == [src]
+
+def test_refuses_to_overwrite_inputs(tmp_path):
+    src = save(str(tmp_path/'in'/'x.png'))
+    before = open(src,'rb').read()
+    assert run(src,'-o',str(tmp_path/'in')) == 2
+    assert open(src,'rb').read() == before
+    assert not os.path.exists(str(tmp_path/'in'/'manifest.csv'))
+
+def test_no_blur_cache_in_workers(monkeypatch):
+    monkeypatch.setattr(fastblur,'CACHE_BYTES',fastblur.CACHE_BYTES)
+    monkeypatch.setattr(fastblur,'CACHE_DIR',fastblur.CACHE_DIR)
+    monkeypatch.setattr(batchenhance.tiles,'WORKERS',
+                        batchenhance.tiles.WORKERS)
+    batchenhance.init_worker(1)
+    misses = fastblur.cache_stats()['misses']
+    arr = np.zeros((8,8),dtype=np.float32)
+    fastblur.cached_blur(arr,2.)
+    assert fastblur.cache_stats()['misses'] == misses
@@ -0,0 +1,48 @@
+'''jagged border maps: every threshold at once, and kept on disk'''
+
+from __future__ import print_function, division
+import os
+import numpy as np
+import pytest
+
+import npprocess
+
+def photo(seed,h=60,w=80):
+    rng = np.random.RandomState(seed)
+    small = rng.randint(0,256,(h//4,w//4,3))
+    arr = np.repeat(np.repeat(small,4,0),4,1) + rng.randint(0,20,(h,w,3))
+    return np.clip(arr,0,255).astype(np.uint8)
+
+@pytest.fixture
+def border_dir(tmp_path,monkeypatch):
+    monkeypatch.setattr(npprocess,'BORDER_MAP_DIR',str(tmp_path))
+    monkeypatch.setattr(npprocess,'_border_maps',npprocess.OrderedDict())
+    return str(tmp_path)
+
+@pytest.mark.parametrize('border_shape',[0,1,3])
+@pytest.mark.parametrize('fill_islands',[False,True])
+def test_map_gives_jagged_border_mask(border_shape,fill_islands):
+    arr = photo(border_shape)
+    bmap = npprocess.border_map(arr,border_shape,True,8,True)
+    for thresh in (1,10,40,120):
+        expected = npprocess.jagged_border_mask(arr,border_shape,True,8,
+                                                thresh,fill_islands,True)
+        assert np.array_equal(bmap.mask(thresh,fill_islands),expected)
+
+def test_maps_on_disk_are_reloaded(border_dir):
+    arr = photo(1)
+    masks = [npprocess.border_map(arr,0,False,8,True).mask(t,True)
+             for t in (5,50)]
+    npprocess._border_maps.clear()
+    bmap = npprocess.border_map(arr,0,False,8,True)
+    assert bmap.islands is not None
+    for t,mask in zip((5,50),masks):
+        assert np.array_equal(bmap.mask(t,True),mask)
+    assert not [n for n in os.listdir(border_dir) if '.tmp.' in n]
+
+def test_maps_on_disk_are_pruned(border_dir,monkeypatch):
+    monkeypatch.setattr(npprocess,'BORDER_MAP_DISK_BYTES',1)
+    for seed in range(3):
+        npprocess.border_map(photo(seed),0,True,8,True)
+    names = os.listdir(border_dir)
+    assert len(names) == 1 and names[0].startswith('border_')
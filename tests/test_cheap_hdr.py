@@ -0,0 +1,72 @@
+'''the cheap_hdr overlay, against the pdb steps done in full color'''
+
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+import fastblur
+import npprocess
+
+def photo(h=90,w=120,channels=3,seed=0):
+    rng = np.random.RandomState(seed)
+    small = rng.randint(0,256,(h//10+1,w//10+1,channels))
+    arr = np.repeat(np.repeat(small,10,0),10,1)[:h,:w]
+    return arr.astype(np.uint8)
+
+def to_linear(v):
+    v = np.asarray(v,dtype=np.float64)/255
+    return np.where(v <= 0.04045,v/12.92,((v+0.055)/1.055)**2.4)
+
+def to_srgb(lin):
+    lin = np.clip(lin,0,1)
+    return 255*np.where(lin <= 0.0031308,12.92*lin,
+                        1.055*lin**(1/2.4) - 0.055)
+
+def pdb_steps(arr,sigma,has_alpha=False):
+    '''
+    what the pdb version does: blur the layer (in linear light, alpha
+    premultiplied), desaturate by luminance (in linear light), invert
+    '''
+    ncolor = arr.shape[-1] - has_alpha
+    lin = to_linear(arr)
+    if has_alpha:
+        lin[...,-1] = arr[...,-1]/255
+    blurred = fastblur.gauss_blur(lin.astype(np.float32),sigma,has_alpha)
+    color = blurred[...,:ncolor]
+    if ncolor == 1:
+        lum = color[...,0]
+    else:
+        lum = color.dot(np.array(npprocess.LUMA_WEIGHTS,dtype=np.float32))
+    gray = 255 - to_srgb(lum)
+    planes = [gray]*ncolor
+    if has_alpha:
+        planes.append(255*blurred[...,-1])
+    return np.dstack(planes)
+
+@pytest.mark.parametrize('channels,has_alpha',[(3,False),(1,False),
+                                               (4,True),(2,True)])
+def test_overlay_is_the_pdb_steps(channels,has_alpha):
+    arr = photo(channels=channels)
+    if has_alpha:
+        arr[:30,:40,-1] = 0
+        arr[60:,:,-1] = 128
+    out = npprocess.cheap_hdr_overlay(arr,6.,has_alpha)
+    assert out.shape == arr.shape
+    assert np.abs(out - pdb_steps(arr,6.,has_alpha)).max() < 0.05
+
+def test_blur_is_not_of_the_srgb_values():
+    ## black and white stripes blur to a linear-light gray (188), not 128
+    arr = np.zeros((40,80,3),dtype=np.uint8)
+    arr[:,::2] = 255
+    out = npprocess.cheap_hdr_overlay(arr,4.)
+    assert abs(255 - out[20,40,0] - 188) < 1
+
+def test_spread_moves_gray_and_alpha_together():
+    arr = photo(channels=4,seed=1)
+    arr[...,-1] = np.arange(120)[None,:]*2
+    plain = npprocess.cheap_hdr_overlay(arr,4.,True)
+    spread = npprocess.cheap_hdr_overlay(arr,4.,True,spread_by=5,seed=3)
+    pairs = set(map(tuple,plain[...,[0,3]].reshape(-1,2).round(3)))
+    assert all(tuple(p) in pairs
+               for p in spread[...,[0,3]].reshape(-1,2).round(3))
+    assert not np.array_equal(spread,plain)
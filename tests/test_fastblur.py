@@ -0,0 +1,54 @@
+'''the numpy blurs of fastblur'''
+
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+import fastblur
+
+def frame(h,w,inner,value,seed=0,channels=3):
+    '''noise, except for a constant inner (y0,y1,x0,x1) rectangle'''
+    rng = np.random.RandomState(seed)
+    arr = rng.randint(0,256,(h,w,channels)).astype(np.float32)
+    y0,y1,x0,x1 = inner
+    arr[y0:y1,x0:x1] = value
+    return arr
+
+@pytest.mark.parametrize('sigma',[3.,10.,25.])
+def test_cascade_variance_is_close_to_sigma(sigma):
+    var = fastblur.cascade_variance(fastblur.box_radii(sigma))
+    assert abs(var - sigma*sigma) < 0.02*sigma*sigma + 1
+
+def test_blur_of_a_constant_is_the_constant():
+    arr = np.full((40,50,3),77,dtype=np.uint8)
+    assert np.allclose(fastblur.gauss_blur(arr,8.),77,atol=1e-3)
+
+@pytest.mark.parametrize('inner',[(40,160,50,200),(0,120,30,250),
+                                  (20,200,0,250)])
+def test_gauss_blur_roi_is_gauss_blur(inner):
+    arr = frame(200,250,inner,(10,200,90))
+    sigma = 6.
+    roi = fastblur.gauss_blur_roi(arr,sigma,inner)
+    assert np.allclose(roi,fastblur.gauss_blur(arr,sigma),atol=1e-3)
+
+def test_gauss_blur_roi_with_alpha():
+    inner = (30,90,30,110)
+    arr = frame(120,140,inner,(50,60,70,255),channels=4)
+    roi = fastblur.gauss_blur_roi(arr,5.,inner,has_alpha=True)
+    full = fastblur.gauss_blur(arr,5.,has_alpha=True)
+    assert np.allclose(roi,full,atol=1e-3)
+
+def test_pyramid_blur_is_close_to_gauss_blur():
+    arr = np.zeros((600,500),dtype=np.float32)
+    arr[150:420,100:330] = 255
+    sigma = fastblur.wide_blur_sigma(250)
+    assert fastblur.pyramid_factor(sigma) > 1
+    err = np.abs(fastblur.pyramid_blur(arr,sigma) -
+                 fastblur.gauss_blur(arr,sigma)).max()
+    assert err < 0.5
+
+def test_scale_space_level_is_gauss_blur():
+    arr = frame(80,90,(0,0,0,0),0)
+    space = fastblur.ScaleSpace(arr)
+    assert np.array_equal(space.level(4.),fastblur.gauss_blur(arr,4.))
+    assert np.array_equal(space.level(0),arr)
@@ -0,0 +1,76 @@
+'''array flood fill against a breadth-first search'''
+
+from __future__ import print_function, division
+from collections import deque
+import numpy as np
+import pytest
+
+import floodfill
+
+def blotches(h,w,seed,colors=4):
+    '''a few colors in patches, so that floods have shapes'''
+    rng = np.random.RandomState(seed)
+    small = rng.randint(0,colors,(h//3+1,w//3+1))
+    levels = np.repeat(np.repeat(small,3,0),3,1)[:h,:w]
+    noise = rng.randint(0,6,(h,w,3))
+    return (levels[...,None]*40 + noise).astype(np.uint8)
+
+def bfs(arr,seeds,threshold):
+    '''fuzzy select the slow way: 4-connected, seed by seed'''
+    h,w = arr.shape[:2]
+    out = np.zeros((h,w),dtype=bool)
+    for x,y in seeds:
+        ref = arr[y,x].astype(int)
+        close = np.abs(arr.astype(int) - ref).max(axis=-1) <= threshold
+        seen = np.zeros((h,w),dtype=bool)
+        seen[y,x] = True
+        todo = deque([(y,x)])
+        while todo:
+            i,j = todo.popleft()
+            for a,b in ((i-1,j),(i+1,j),(i,j-1),(i,j+1)):
+                if 0 <= a < h and 0 <= b < w and close[a,b] and not seen[a,b]:
+                    seen[a,b] = True
+                    todo.append((a,b))
+        out |= seen
+    return out
+
+SEEDS = [[(0,0)],[(0,0),(59,0),(0,44),(59,44)],[(30,20),(31,20)]]
+
+@pytest.mark.parametrize('seed',range(3))
+@pytest.mark.parametrize('seeds',SEEDS)
+@pytest.mark.parametrize('threshold',[0,5,20,60])
+def test_flood_is_bfs(seed,seeds,threshold):
+    arr = blotches(45,60,seed)
+    assert np.array_equal(floodfill.flood(arr,seeds,threshold),
+                          bfs(arr,seeds,threshold))
+
+@pytest.mark.parametrize('seed',range(3))
+def test_label_counts_components(seed):
+    mask = np.random.RandomState(seed).rand(30,40) < 0.5
+    labels,count = floodfill.label(mask)
+    assert np.array_equal(labels > 0,mask)
+    remaining = mask.copy()
+    components = 0
+    while remaining.any():
+        y,x = np.argwhere(remaining)[0]
+        component = bfs(np.uint8(remaining)[...,None]*255,[(x,y)],0)
+        assert len(np.unique(labels[component])) == 1
+        remaining &= ~component
+        components += 1
+    assert count == components
+
+@pytest.mark.parametrize('seed',range(2))
+def test_flood_levels_are_floods(seed):
+    arr = blotches(30,40,seed)
+    seeds = [(0,0),(39,29)]
+    levels = floodfill.flood_levels(arr,seeds)
+    for t in (0,3,10,40,90,200):
+        assert np.array_equal(levels <= t,floodfill.flood(arr,seeds,t))
+
+def test_island_levels_are_filled_islands():
+    arr = blotches(30,40,5)
+    levels = floodfill.flood_levels(arr,[(0,0)])
+    islands = floodfill.island_levels(levels,0,0)
+    for t in (5,40,90):
+        assert np.array_equal(islands <= t,
+                              floodfill.fill_islands(levels <= t,0,0,t))
@@ -0,0 +1,78 @@
+'''histograms, statistics and lookup tables of imagestats'''
+
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+import imagestats
+
+def image(shape,seed=0,dtype=np.uint8,top=256):
+    return np.random.RandomState(seed).randint(0,top,shape).astype(dtype)
+
+@pytest.mark.parametrize('has_alpha',[False,True])
+def test_histograms_count_each_color_channel(monkeypatch,has_alpha):
+    monkeypatch.setattr(imagestats,'BAND_ROWS',7)
+    arr = image((30,20,4))
+    hist = imagestats.histograms(arr,has_alpha)
+    assert hist.shape == (3 if has_alpha else 4,256)
+    for c in range(hist.shape[0]):
+        assert np.array_equal(hist[c],np.bincount(arr[...,c].ravel(),
+                                                  minlength=256))
+
+def test_histograms_of_samples_and_uint16():
+    arr = image((30,20,3),1)
+    sampled = imagestats.histograms(arr,sample=3)
+    assert np.array_equal(sampled,imagestats.histograms(arr[::3,::3]))
+    wide = image((10,10,1),2,np.uint16,65536)
+    assert imagestats.histograms(wide).shape == (1,65536)
+
+def test_statistics_are_those_of_the_pixels():
+    arr = image((40,30,3),3)
+    stats = imagestats.ImageStats(arr)
+    flat = arr.reshape(-1,3)
+    assert stats.minimum() == flat.min(axis=0).tolist()
+    assert stats.maximum() == flat.max(axis=0).tolist()
+    assert np.allclose(stats.mean(),flat.mean(axis=0))
+    for q in (1,25,50,99,100):
+        expected = [int(np.sort(flat[:,c])[int(np.ceil(q/100*len(flat)))-1])
+                    for c in range(3)]
+        assert stats.percentile(q) == expected
+
+def test_stretch_luts_map_bounds_to_the_ends():
+    arr = (image((50,50,3),4)//2 + 60).astype(np.uint8)
+    stats = imagestats.ImageStats(arr)
+    luts = stats.stretch_luts()
+    for (low,high),lut in zip(stats.stretch_bounds(),luts):
+        assert 60 <= low < high <= 187
+        assert lut[low] == 0 and lut[high] == 255
+        assert (np.diff(lut) >= 0).all()
+
+def test_apply_luts_leaves_alpha_alone():
+    arr = image((10,12,4),5)
+    luts = np.array([255-np.arange(256)]*3,dtype=np.float32)
+    out = imagestats.apply_luts(arr,luts)
+    assert np.array_equal(out[...,:3],255-arr[...,:3].astype(np.float32))
+    assert np.array_equal(out[...,3],arr[...,3])
+
+def test_fed_pixels_are_only_made_when_asked_for():
+    calls = []
+    def compute():
+        calls.append(1)
+        return image((8,8,3),6)
+    imagestats.forget()
+    imagestats.feed('state',compute)
+    assert not calls
+    stats = imagestats.stats('state')
+    assert imagestats.stats('state') is stats
+    assert imagestats.pixels('state') is imagestats.pixels('state')
+    assert len(calls) == 1
+    assert imagestats.pixels('other') is None
+    imagestats.forget()
+
+def test_only_the_newest_states_are_kept():
+    imagestats.forget()
+    for k in range(imagestats.MAX_STATES+1):
+        imagestats.feed(k,lambda: image((2,2,1)))
+    assert imagestats.pixels(0) is None
+    assert imagestats.pixels(imagestats.MAX_STATES) is not None
+    imagestats.forget()
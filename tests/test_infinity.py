@@ -0,0 +1,90 @@
+'''the infinity bows, and the one-pass figure-eight'''
+
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+import remap
+
+def blocky(h,w,seed=0):
+    ## 4x4 blocks of color, so that resampling differences stay small
+    rng = np.random.RandomState(seed)
+    rgb = rng.randint(0,256,(h//4,w//4,3))
+    rgb = np.repeat(np.repeat(rgb,4,0),4,1)
+    return np.dstack([rgb,np.full((h,w),255)]).astype(np.uint8)
+
+def pdb_bows(src):
+    '''the bows the way process.infinity_bows_pdb makes them'''
+    q = src.shape[1]//4
+    bows = []
+    for k in range(4):
+        bow = remap.pan_to_bow(src[:,k*q:(k+1)*q],180,k in (2,3))
+        if k in (0,3):
+            bow = bow[::-1,::-1]
+        bows.append(bow)
+    return bows
+
+def layer_stack(src,bkg,vfix):
+    '''
+    the bows as process.infinity stacks its layers (bottom to top: 3, 0,
+    1, 2), over a background layer the size of the canvas
+    '''
+    bows = pdb_bows(src)
+    h = src.shape[0]
+    H,W = bows[0].shape[:2]
+    out = np.empty((2*H,2*W-h,4),dtype=np.float32)
+    out[...] = list(bkg) + [255]
+    for k,x,y in [(3,W-h,vfix),(0,0,H-vfix),(1,0,vfix),(2,W-h,H-vfix)]:
+        yb,xb = min(y+H,out.shape[0]),min(x+W,out.shape[1])
+        out[y:yb,x:xb] = remap.over(bows[k][:yb-y,:xb-x],out[y:yb,x:xb])
+    return out
+
+def test_bows_match_the_quarters_flipped():
+    src = blocky(40,400)
+    for bow,ref in zip(remap.infinity_bows(src,workers=1),pdb_bows(src)):
+        assert bow.shape == ref.shape
+        assert np.allclose(bow,ref,atol=1e-3)
+
+def test_bows_do_not_depend_on_workers():
+    src = blocky(40,400,1)
+    one = remap.infinity_bows(src,workers=1)
+    four = remap.infinity_bows(src,workers=4)
+    for a,b in zip(one,four):
+        assert np.array_equal(a,b)
+
+def test_bows_without_alpha():
+    src = blocky(40,400,2)
+    bows = remap.infinity_bows(src[...,:3],has_alpha=False,workers=1)
+    for bow,ref in zip(bows,pdb_bows(src)):
+        assert np.allclose(bow,ref,atol=1e-3)
+
+@pytest.mark.parametrize('vfix',[0,2])
+def test_one_pass_matches_the_layers(vfix):
+    src = blocky(40,400,3)
+    bkg = (10,20,30)
+    out = remap.infinity(src,bkg,vfix)
+    ref = layer_stack(src,bkg,vfix)
+    assert out.shape == ref.shape
+    H = remap.infinity_bows(src,workers=1)[0].shape[0]
+    diff = np.abs(out - ref).max(axis=-1)
+    ## the one-pass version reads across the joins where the layers have
+    ## an edge: the last row of the upper bows and the first of the lower
+    seams = [H-vfix,H+vfix-1]
+    rest = np.delete(diff,seams,axis=0)
+    assert rest.max() < 0.5
+    assert diff.mean() < 0.2
+
+def test_one_pass_canvas_size():
+    h,w = 40,400
+    out = remap.infinity(blocky(h,w),(0,0,0))
+    H,W = remap.infinity_bows(blocky(h,w),workers=1)[0].shape[:2]
+    assert out.shape[:2] == (2*H,2*W-h)
+    assert (out[...,3] == 255).all()
+
+def test_one_pass_gray_background():
+    src = blocky(40,400,4)
+    gray = np.dstack([src[...,:3].mean(axis=-1),src[...,3]])
+    out = remap.infinity(gray,(30,60,90))
+    assert out.shape[2] == 2
+    ## the corners are background, averaged to one gray value
+    assert np.allclose(out[0,-1],[60,255])
@@ -0,0 +1,54 @@
+'''pixels.read and pixels.write, on a FakeDrawable'''
+
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+import pixels
+
+def image(shape,seed=0):
+    return np.random.RandomState(seed).randint(0,256,shape).astype(np.uint8)
+
+@pytest.mark.parametrize('bpp',[1,2,3,4])
+def test_read_is_the_data(bpp):
+    data = image((37,53,bpp))
+    assert np.array_equal(pixels.read(pixels.FakeDrawable(data)),data)
+
+def test_read_rect():
+    data = image((40,60,3))
+    drawable = pixels.FakeDrawable(data)
+    assert np.array_equal(pixels.read(drawable,5,7,20,11),data[7:18,5:25])
+    assert np.array_equal(pixels.read(drawable,50,30),data[30:,50:])
+
+def test_write_then_read(monkeypatch):
+    ## several bands, the last one short
+    monkeypatch.setattr(pixels,'BAND_ROWS',8)
+    drawable = pixels.FakeDrawable(np.zeros((29,31,4),dtype=np.uint8))
+    data = image((29,31,4),1)
+    pixels.write(drawable,data)
+    assert np.array_equal(pixels.read(drawable),data)
+    assert drawable.shadow is None
+    assert drawable.updates == [(0,0,31,29)]
+
+def test_write_rect_leaves_the_rest():
+    data = image((30,40,3))
+    drawable = pixels.FakeDrawable(data)
+    patch = image((10,12,3),2)
+    pixels.write(drawable,patch,x=20,y=15)
+    expected = data.copy()
+    expected[15:25,20:32] = patch
+    assert np.array_equal(drawable.data,expected)
+
+def test_write_rounds_and_clips():
+    drawable = pixels.FakeDrawable(np.zeros((2,3,1),dtype=np.uint8))
+    pixels.write(drawable,np.array([[-4.,0.4,0.6],[254.5,255.2,300.]]))
+    assert drawable.data[...,0].tolist() == [[0,0,1],[254,255,255]]
+
+def test_write_checks_channels_and_bounds():
+    drawable = pixels.FakeDrawable(np.zeros((10,10,3),dtype=np.uint8))
+    with pytest.raises(ValueError):
+        pixels.write(drawable,np.zeros((10,10,4)))
+    with pytest.raises(ValueError):
+        pixels.write(drawable,np.zeros((5,5,3)),x=8)
+    with pytest.raises(ValueError):
+        pixels.read(drawable,0,0,11,10)
@@ -0,0 +1,80 @@
+'''the fused quick_enhance against the step-by-step layers, composited'''
+
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+import npprocess
+
+def photo(h=180,w=240,seed=0):
+    '''smooth shading with some texture, so that each step does something'''
+    rng = np.random.RandomState(seed)
+    y,x = np.mgrid[0:h,0:w]/float(max(h,w))
+    base = 40 + 150*np.dstack([x,y,(x+y)/2])
+    base += 30*np.sin(20*x)[...,None] + rng.normal(0,12,(h,w,3))
+    return np.clip(np.rint(base),0,255).astype(np.uint8)
+
+def to_linear(v):
+    v = np.asarray(v,dtype=np.float64)/255
+    return np.where(v <= 0.04045,v/12.92,((v+0.055)/1.055)**2.4)
+
+def to_srgb(lin):
+    lin = np.clip(lin,0,1)
+    return 255*np.where(lin <= 0.0031308,12.92*lin,
+                        1.055*lin**(1/2.4) - 0.055)
+
+def shown(base,top,opacity):
+    '''what the GIMP shows (as uint8) with top over base at opacity'''
+    mixed = (1-opacity)*to_linear(base) + opacity*to_linear(top)
+    return np.rint(to_srgb(mixed)).astype(np.uint8)
+
+def as_layer(arr):
+    return np.clip(np.rint(arr),0,255).astype(np.uint8)
+
+def step_by_step(arr,sigma,r_sharp,mode,f_hdr,f_stretch):
+    '''
+    the three layers of the step-by-step version, each made from a
+    uint8 copy of what the image shows, and what is shown in the end
+    '''
+    hdr = as_layer(npprocess.cheap_hdr_overlay(arr,sigma))
+    shown_hdr = shown(arr,npprocess.overlay(arr,hdr[...,0]),f_hdr)
+    sharp = as_layer(npprocess.unsharp_mask(shown_hdr,r_sharp))
+    shown_sharp = as_layer(npprocess.BLEND_MODES[mode](shown_hdr,sharp))
+    stretched = as_layer(npprocess.levels_stretch(shown_sharp))
+    return hdr,sharp,stretched,shown(shown_sharp,stretched,f_stretch)
+
+def close(arr,ref,most=5,mean=0.6,over=0.06):
+    '''
+    within rounding: at most a few levels apart, less than mean on
+    average, and more than one level apart at no more than a fraction
+    over of the pixels
+    '''
+    diff = np.abs(arr.astype(int) - ref)
+    return (diff.max() <= most and diff.mean() < mean and
+            (diff > 1).mean() < over)
+
+@pytest.mark.parametrize('mode',sorted(npprocess.BLEND_MODES))
+@pytest.mark.parametrize('f_hdr,f_stretch',[(.5,.5),(.8,.3),(1.,0.)])
+def test_fused_is_the_step_by_step_composite(mode,f_hdr,f_stretch):
+    arr = photo()
+    sigma,r_sharp = 12.,3
+    hdr,sharp,stretched,expected = step_by_step(arr,sigma,r_sharp,mode,
+                                                f_hdr,f_stretch)
+    result, = npprocess.quick_enhance(arr,sigma,0,f_hdr,r_sharp,mode,
+                                      f_stretch)
+    ## the step-by-step version rounds to 8 bits between the steps, and
+    ## the unsharp mask magnifies that; mixing the opacities on the
+    ## sRGB values instead is off by over a level on average
+    assert close(as_layer(result),expected)
+    stack = npprocess.quick_enhance(arr,sigma,0,f_hdr,r_sharp,mode,
+                                    f_stretch,stack=True)
+    assert np.array_equal(as_layer(stack[0]),hdr)
+    assert close(as_layer(stack[1]),sharp)
+    if f_stretch:
+        ## the stretch magnifies the rounding again
+        assert close(as_layer(stack[2]),stretched,8,0.7,0.16)
+
+def test_mix_linear_is_not_a_mix_of_srgb_values():
+    black,white = np.zeros(1),np.full(1,255.)
+    ## half-way in linear light is 188 in sRGB, not 128
+    assert np.rint(npprocess.mix_linear(black,white,0.5))[0] == 188
@@ -0,0 +1,62 @@
+'''mirror and accordion, tiled in one array'''
+
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+import npprocess
+
+def rgba(h,w,seed=0):
+    return np.random.RandomState(seed).randint(0,256,(h,w,4)).astype(np.uint8)
+
+def visible_base(arr,hflip,vflip):
+    arr = arr[::-1] if vflip else arr
+    return arr[:,::-1] if hflip else arr
+
+def reflect(arr,axis):
+    '''as process.reflect: abut with its (whole) mirror image'''
+    return np.concatenate([arr,np.flip(arr,axis)],axis=axis)
+
+def accord_1d(arr,n,do_flip,axis):
+    '''as process.accord_1d: n copies in a row, the odd ones flipped'''
+    return np.concatenate([np.flip(arr,axis) if do_flip and i % 2 else arr
+                           for i in range(n)],axis=axis)
+
+def pdb_mirror(arr,m_horiz,m_vert,hflip,vflip):
+    arr = visible_base(arr,hflip,vflip)
+    if m_horiz:
+        arr = reflect(arr,1)
+    if m_vert:
+        arr = reflect(arr,0)
+    return arr
+
+def pdb_accordion(arr,n_horiz,n_vert,do_flip,hflip,vflip):
+    arr = visible_base(arr,hflip,vflip)
+    if n_horiz > 1:
+        arr = accord_1d(arr,n_horiz,do_flip,1)
+    if n_vert > 1:
+        arr = accord_1d(arr,n_vert,do_flip,0)
+    return arr
+
+@pytest.mark.parametrize('m_horiz,m_vert',[(1,0),(0,1),(1,1)])
+@pytest.mark.parametrize('hflip,vflip',[(0,0),(1,0),(0,1),(1,1)])
+def test_mirror_is_the_pdb_steps(m_horiz,m_vert,hflip,vflip):
+    arr = rgba(7,11)
+    out = npprocess.reflections(arr,2 if m_horiz else 1,2 if m_vert else 1,
+                                True,hflip,vflip)
+    assert np.array_equal(out,pdb_mirror(arr,m_horiz,m_vert,hflip,vflip))
+
+@pytest.mark.parametrize('n_horiz,n_vert',[(3,1),(1,4),(3,2),(5,5)])
+@pytest.mark.parametrize('do_flip',[True,False])
+@pytest.mark.parametrize('hflip,vflip',[(0,0),(1,1)])
+def test_accordion_is_the_pdb_steps(n_horiz,n_vert,do_flip,hflip,vflip):
+    arr = rgba(6,9,1)
+    out = npprocess.reflections(arr,n_horiz,n_vert,do_flip,hflip,vflip)
+    assert out.shape == (6*n_vert,9*n_horiz,4) and out.dtype == arr.dtype
+    assert np.array_equal(out,pdb_accordion(arr,n_horiz,n_vert,do_flip,
+                                            hflip,vflip))
+
+def test_reflections_of_a_gray_plane():
+    arr = rgba(5,8,2)[...,0]
+    out = npprocess.reflections(arr,2,3,True)
+    assert np.array_equal(out,pdb_accordion(arr,2,3,True,False,False))
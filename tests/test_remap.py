@@ -0,0 +1,86 @@
+'''remapping tables, their cache, and remap'''
+
+from __future__ import print_function, division
+import os
+import numpy as np
+import pytest
+
+import remap
+
+def rgba(h,w,seed=0):
+    arr = np.random.RandomState(seed).randint(0,256,(h,w,4)).astype(np.uint8)
+    arr[...,3] = 255
+    return arr
+
+def identity(h,w):
+    ys,xs = np.mgrid[0:h,0:w].astype(np.float32)
+    return remap.RemapTable.from_coords(xs,ys,w,h)
+
+def test_identity_table_gives_the_source():
+    src = rgba(20,30)
+    assert np.allclose(remap.gather(src,identity(20,30)),src,atol=1e-3)
+
+def test_half_pixel_is_the_average():
+    src = rgba(4,5)
+    xs = np.full((1,1),1.5,dtype=np.float32)
+    ys = np.full((1,1),2.,dtype=np.float32)
+    table = remap.RemapTable.from_coords(xs,ys,5,4)
+    expected = (src[2,1].astype(float) + src[2,2])/2
+    assert np.allclose(remap.gather(src,table)[0,0],expected,atol=1e-3)
+
+def test_off_pixels_are_transparent():
+    xs = np.array([[-1,0]],dtype=np.float32)
+    ys = np.array([[-1,0]],dtype=np.float32)
+    out = remap.gather(rgba(3,3),remap.RemapTable.from_coords(xs,ys,3,3))
+    assert (out[0,0] == 0).all() and out[0,1,3] == 255
+
+def test_remap_does_not_depend_on_workers():
+    src = rgba(60,200,1)
+    table = remap.bow_table(200,60,120.)
+    one = remap.remap(src,table,workers=1)
+    assert np.array_equal(one,remap.remap(src,table,workers=4))
+    assert one.shape[:2] == table.shape
+
+def test_save_and_load(tmp_path):
+    table = remap.bow_table(50,20,90.)
+    path = str(tmp_path/'t.npz')
+    table.save(path)
+    loaded = remap.RemapTable.load(path)
+    for a,b in zip((table.x0,table.y0,table.fx,table.fy),
+                   (loaded.x0,loaded.y0,loaded.fx,loaded.fy)):
+        assert np.array_equal(a,b)
+
+def test_arc_up_is_flipped():
+    src = rgba(30,90,2)
+    down = remap.remap(src,remap.bow_table(90,30,150.))
+    up = remap.remap(src[::-1],remap.bow_table(90,30,150.,arc_up=True))
+    assert np.allclose(up[::-1],down,atol=1e-3)
+
+def test_cache_is_lru_within_its_size():
+    one = identity(10,10).nbytes
+    cache = remap.TableCache(2*one)
+    for key in ('a','b','a','c'):
+        cache.get((key,),lambda: identity(10,10))
+    assert cache.stats()['misses'] == 3
+    assert cache.stats()['hits'] == 1
+    ## 'b' was least recently used
+    assert list(cache.tables) == [('a',),('c',)]
+
+def test_cache_on_disk(tmp_path):
+    disk = str(tmp_path)
+    cache = remap.TableCache(2**20,disk)
+    table = cache.get((5,6),lambda: identity(6,5))
+    assert os.path.exists(cache.path((5,6)))
+    again = remap.TableCache(2**20,disk)
+    def fail():
+        raise AssertionError('should come from disk')
+    loaded = again.get((5,6),fail)
+    assert again.stats()['disk_hits'] == 1
+    assert np.array_equal(loaded.x0,table.x0)
+
+def test_cache_does_not_keep_a_table_over_its_size():
+    cache = remap.TableCache(identity(10,10).nbytes)
+    cache.get(('small',),lambda: identity(10,10))
+    cache.get(('big',),lambda: identity(100,100))
+    assert list(cache.tables) == [('small',)]
+    assert cache.nbytes == identity(10,10).nbytes
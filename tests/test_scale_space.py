@@ -0,0 +1,94 @@
+'''the shared Gaussian stack of cheap_hdr and sharpen'''
+
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+import fastblur
+import npprocess
+
+def noise(h,w,channels=3,seed=0):
+    rng = np.random.RandomState(seed)
+    return rng.randint(0,256,(h,w,channels)).astype(np.float32)
+
+def photo(h,w,seed=0):
+    '''noise blurred a little, so it has structure at several scales'''
+    return fastblur.gauss_blur(noise(h,w,3,seed),2.)
+
+def test_level_from_the_image_is_gauss_blur():
+    arr = photo(90,110)
+    space = fastblur.ScaleSpace(arr)
+    assert np.array_equal(space.level(6.),fastblur.gauss_blur(arr,6.))
+
+@pytest.mark.parametrize('finer,sigma',[(3.,6.),(4.,12.),(6.,8.)])
+def test_level_from_a_finer_level_is_close_to_gauss_blur(finer,sigma):
+    arr = photo(160,200,1)
+    space = fastblur.ScaleSpace(arr)
+    space.level(finer)
+    ## the variances add, and the edges are kept as if blurred in one step;
+    ## what is left is the box cascades not being quite Gaussian
+    err = np.abs(space.level(sigma) - fastblur.gauss_blur(arr,sigma))
+    assert err.max() < 1
+
+def test_levels_do_not_depend_on_the_order_asked():
+    arr = photo(160,200,2)
+    up,down = fastblur.ScaleSpace(arr),fastblur.ScaleSpace(arr)
+    for sigma in (2.,5.,10.):
+        up.level(sigma)
+    err = np.abs(up.level(10.) - down.level(10.))
+    assert err.max() < 0.5
+
+def test_detail_is_the_unsharp_mask_high_pass():
+    arr = photo(80,100,3)
+    space = fastblur.ScaleSpace(arr)
+    assert np.allclose(space.detail(5.),arr - fastblur.gauss_blur(arr,5.),
+                       atol=1e-3)
+
+def test_band_is_a_difference_of_gaussians():
+    arr = photo(160,200,4)
+    space = fastblur.ScaleSpace(arr)
+    ref = fastblur.gauss_blur(arr,4.) - fastblur.gauss_blur(arr,10.)
+    err = np.abs(space.band(4.,10.) - ref)
+    assert err.max() < 1
+
+def test_levels_with_alpha_are_blurred_premultiplied():
+    arr = noise(90,110,4,5)
+    space = fastblur.ScaleSpace(arr,has_alpha=True)
+    ref = fastblur.gauss_blur(arr,5.,has_alpha=True)
+    assert np.allclose(space.level(5.),ref,atol=0.05)
+    ## where alpha is zero, so is the color
+    seen = arr[...,3] > 0
+    assert np.allclose(space.level(0)[seen],arr[seen],atol=1e-3)
+
+def test_a_plane_stays_a_plane():
+    plane = photo(60,70)[...,0]
+    space = fastblur.ScaleSpace(plane)
+    assert space.level(3.).shape == plane.shape
+    assert np.allclose(space.level(3.),fastblur.gauss_blur(plane,3.))
+
+def test_fast_levels_are_close_to_pyramid_blurs():
+    arr = photo(300,260,6)
+    sigma = fastblur.wide_blur_sigma(150)
+    assert fastblur.pyramid_factor(sigma) > 1
+    space = fastblur.ScaleSpace(arr,fast=True)
+    err = np.abs(space.level(sigma) - fastblur.pyramid_blur(arr,sigma))
+    assert err.max() < 0.1
+
+def test_forget_drops_only_that_level():
+    arr = photo(80,90,7)
+    space = fastblur.ScaleSpace(arr)
+    space.level(4.)
+    space.level(8.)
+    space.forget(4.)
+    assert sorted(space.stack) == [0.,8.]
+    ## made again, from the image
+    assert np.array_equal(space.level(4.),fastblur.gauss_blur(arr,4.))
+    space.forget(99.)
+    assert sorted(space.stack) == [0.,4.,8.]
+
+def test_blur_luminance_shares_the_space():
+    arr = photo(70,80,8)
+    space = npprocess.luminance_space(arr)
+    lum = space.level(0)
+    assert np.allclose(npprocess.blur_luminance(arr,6.,space=space)[0],
+                       fastblur.gauss_blur(lum,6.),atol=1e-3)
@@ -0,0 +1,117 @@
+'''the fibonacci spiral, drawn from a pyramid'''
+
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+import npprocess
+
+## process.fibonacci_steps(89,55,False) and (55,55,True)
+STEPS = [(1,55,34,55,0),(2,34,21,55,34),(3,21,13,55,34),(4,13,8,55,34),
+         (5,8,5,63,34),(6,5,3,63,39),(7,3,2,63,39),(8,2,1,63,39),
+         (9,1,1,64,39)]
+SQUARE_STEPS = [(1,34,34,55,0),(2,21,21,68,34),(3,13,13,55,42),
+                (4,8,8,55,34),(5,5,5,63,34),(6,3,3,65,39),(7,2,2,63,40),
+                (8,1,1,63,39),(9,1,1,64,39)]
+
+def smooth(h,w,alpha=None):
+    '''gentle gradients, which resizing leaves nearly alone'''
+    ys,xs = np.mgrid[0:h,0:w].astype(np.float32)
+    arr = np.dstack([255*xs/(w-1),255*ys/(h-1),127 + 100*np.sin(xs/9 + ys/13)])
+    if alpha is not None:
+        arr = np.dstack([arr,np.full((h,w),alpha)])
+    return np.rint(arr).astype(np.uint8)
+
+def area_resize(arr,h,w):
+    '''arr resized to h x w, each pixel the area average of what it covers'''
+    def weights(n_out,n_in):
+        m = np.zeros((n_out,n_in))
+        for i in range(n_out):
+            a,b = i*n_in/n_out,(i+1)*n_in/n_out
+            for j in range(int(a),int(np.ceil(b))):
+                m[i,j] = min(b,j+1) - max(a,j)
+        return m/m.sum(axis=1)[:,None]
+    return np.einsum('ij,jkc,lk->ilc',weights(h,arr.shape[0]),
+                     arr.astype(np.float64),weights(w,arr.shape[1]))
+
+def paste(canvas,tile,x,y):
+    canvas[y:y+tile.shape[0],x:x+tile.shape[1]] = tile
+
+def layer_stack(arr,placements):
+    '''the layers of the spiral, each over the ones before it, in one canvas'''
+    h,w = arr.shape[:2]
+    right = max([w] + [x+t.shape[1] for _,t,x,_ in placements])
+    bottom = max([h] + [y+t.shape[0] for _,t,_,y in placements])
+    canvas = np.zeros((bottom,right)+arr.shape[2:],dtype=np.uint8)
+    paste(canvas,arr,0,0)
+    for _,tile,x,y in placements:
+        paste(canvas,np.rint(tile),x,y)
+    return canvas
+
+def test_halve_is_the_block_average():
+    arr = np.arange(5*7*3,dtype=np.float32).reshape((5,7,3))
+    half = npprocess.halve(arr)
+    assert half.shape == (3,4,3)
+    assert np.allclose(half[0,0],arr[:2,:2].mean(axis=(0,1)))
+    ## the ragged last row and column are averaged alone
+    assert np.allclose(half[2,1],arr[4,2:4].mean(axis=0))
+    assert np.allclose(half[2,3],arr[4,6])
+
+def test_pyramid_goes_down_to_one_pixel():
+    levels = npprocess.pyramid_levels(np.zeros((55,89,3)))
+    assert [l.shape[:2] for l in levels][-1] == (1,1)
+    assert all(max(a.shape[:2]) > max(b.shape[:2])
+               for a,b in zip(levels,levels[1:]))
+
+@pytest.mark.parametrize('q_turn',[1,3])
+@pytest.mark.parametrize('h,w',[(55,89),(54,90)])
+def test_placements_are_the_scaled_and_turned_copies(h,w,q_turn):
+    arr = smooth(h,w)
+    placed = list(npprocess.spiral_placements(arr,STEPS,q_turn))
+    assert [(c,x,y) for c,_,x,y in placed] == [(c,x,y) for c,_,_,x,y in STEPS]
+    for (count,tile,_,_),(_,tw,th,_,_) in zip(placed,STEPS):
+        ## as the pdb does: scale the full copy, then turn it
+        ref = np.rot90(area_resize(arr,th,tw),-(count*q_turn % 4))
+        assert tile.shape == ref.shape
+        ## the tail's copies are too small to tell
+        if min(th,tw) >= npprocess.SPIRAL_TAIL:
+            err = np.abs(tile - ref)
+            assert err.mean() < 1 and err.max() < 6
+
+@pytest.mark.parametrize('steps,q_turn',[(STEPS,1),(STEPS,3),
+                                         (SQUARE_STEPS,1),(SQUARE_STEPS,2)])
+def test_canvas_is_the_flattened_layers(steps,q_turn):
+    w = 55 if steps is SQUARE_STEPS else 89
+    arr = smooth(55,w)
+    canvas,x0,y0 = npprocess.spiral_canvas(arr,steps,q_turn)
+    assert (x0,y0) == (0,0)
+    ref = layer_stack(arr,list(npprocess.spiral_placements(arr,steps,q_turn)))
+    assert np.array_equal(canvas,ref)
+
+def test_tiles_and_tail_make_up_the_canvas():
+    arr = smooth(55,89,255)
+    tiles = npprocess.spiral_tiles(arr,STEPS,1)
+    names = [name for name,_,_,_ in tiles]
+    assert names[-1] == 'Spiral tail'
+    assert names[:-1] == ['Spiral %d' % c for c,w,h,_,_ in STEPS
+                          if min(w,h) >= npprocess.SPIRAL_TAIL]
+    canvas,_,_ = npprocess.spiral_canvas(arr,STEPS,1)
+    assert np.array_equal(layer_stack(arr,tiles),canvas)
+
+def test_tail_holds_the_tiny_copies_in_order():
+    arr = smooth(55,89)
+    placed = [(c,t,x,y) for c,t,x,y in
+              npprocess.spiral_placements(arr,STEPS,1)
+              if min(t.shape[:2]) < npprocess.SPIRAL_TAIL]
+    _,tail,x0,y0 = npprocess.spiral_tiles(arr,STEPS,1)[-1]
+    ref = np.zeros_like(tail)
+    for _,tile,x,y in placed:
+        paste(ref,tile,x-x0,y-y0)
+    assert np.array_equal(tail,ref)
+
+def test_is_opaque():
+    assert npprocess.is_opaque(smooth(5,6),False)
+    assert npprocess.is_opaque(smooth(5,6,255),True)
+    arr = smooth(5,6,255)
+    arr[2,3,3] = 254
+    assert not npprocess.is_opaque(arr,True)
@@ -0,0 +1,45 @@
+'''the stretch from fed pixels against the stretch from a visible copy'''
+
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+import imagestats
+import npprocess
+
+def image(seed,shape=(64,80,3)):
+    return np.random.RandomState(seed).randint(0,256,shape).astype(np.uint8)
+
+def gimp_visible(base,top,blend,opacity):
+    '''
+    what the GIMP 2.10 shows: the blend (worked out by blend, from sRGB
+    values) mixed with base by opacity in linear light, read back as uint8
+    '''
+    mixed = ((1-opacity)*npprocess.srgb_to_linear(base) +
+             opacity*npprocess.srgb_to_linear(blend(base,top)))
+    return np.rint(npprocess.linear_to_srgb(mixed)).astype(np.uint8)
+
+def fed_stretch(state,base,top,mode,opacity):
+    '''stretch the way process.stretch does after a step fed imagestats'''
+    imagestats.feed(state,lambda:
+                    npprocess.composite(base,top,mode,opacity))
+    try:
+        return npprocess.levels_stretch(imagestats.pixels(state),False,
+                                        imagestats.stats(state))
+    finally:
+        imagestats.forget(state)
+
+@pytest.mark.parametrize('mode',sorted(npprocess.BLEND_MODES))
+def test_fed_matches_visible_for_opaque_full_opacity(mode):
+    base,top = image(1),image(2)
+    visible = gimp_visible(base,top,npprocess.BLEND_MODES[mode],1.)
+    fed = fed_stretch(('test',mode),base,top,mode,1.)
+    assert np.array_equal(fed,npprocess.levels_stretch(visible))
+
+def test_fed_differs_from_visible_for_half_opaque_overlay():
+    ## which is why process.composite_matches turns such feeds down
+    base,gray = image(3),image(4,(64,80,1))
+    overlay = lambda b,t: npprocess.overlay(b,t[...,0],1.)
+    visible = gimp_visible(base,gray,overlay,0.5)
+    fed = fed_stretch(('test','overlay'),base,gray,'overlay',0.5)
+    assert np.abs(fed-npprocess.levels_stretch(visible)).max() > 1
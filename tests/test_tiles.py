@@ -0,0 +1,70 @@
+'''tiled results do not depend on the tiles, nor on the worker threads'''
+
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+import fastblur
+import npprocess
+import tiles
+
+@pytest.fixture
+def workers():
+    '''set tiles.WORKERS for a test, and put it back afterwards'''
+    saved = tiles.WORKERS
+    yield tiles.set_workers
+    tiles.WORKERS = saved
+
+def image(shape,seed=0):
+    return np.random.RandomState(seed).randint(0,256,shape).astype(np.uint8)
+
+def test_tile_rects_cover_once():
+    count = np.zeros((70,45),dtype=int)
+    for y0,y1,x0,x1 in tiles.tile_rects(70,45,16):
+        count[y0:y1,x0:x1] += 1
+    assert (count == 1).all()
+
+@pytest.mark.parametrize('n',[1,3,8])
+def test_map_tiles_with_halo_is_whole(n):
+    arr = image((90,70,3)).astype(np.float32)
+    sigma = 3.
+    kernel = lambda a: fastblur.gauss_blur(a,sigma)
+    tiled = tiles.map_tiles(kernel,arr,halo=fastblur.blur_reach(sigma),
+                            size=32,workers=n)
+    assert np.allclose(tiled,kernel(arr),atol=1e-3)
+
+def test_spread_does_not_depend_on_workers(workers):
+    arr = image((1100,1300,3))
+    results = []
+    for n in (1,2,5):
+        workers(n)
+        results.append(npprocess.spread(arr,7,seed=11))
+    assert all(np.array_equal(r,results[0]) for r in results[1:])
+    assert not np.array_equal(results[0],arr)
+
+def test_spread_moves_pixels_by_at_most_amount(workers):
+    workers(2)
+    h,w,amount = 50,60,4
+    ## each pixel's value is its own position
+    pos = np.arange(h*w).reshape(h,w,1)
+    moved = npprocess.spread(pos,amount,seed=3)[...,0]
+    ys,xs = np.divmod(moved,w)
+    assert np.abs(ys - np.arange(h)[:,None]).max() <= amount
+    assert np.abs(xs - np.arange(w)).max() <= amount
+
+def test_unsharp_mask_does_not_depend_on_workers(workers):
+    arr = image((1100,1200,3),1)
+    results = []
+    for n in (1,4):
+        workers(n)
+        results.append(npprocess.unsharp_mask(arr,5))
+    assert np.array_equal(results[0],results[1])
+
+def test_unsharp_mask_tiles_match_the_whole():
+    arr = image((1100,1200,1),2)
+    whole = npprocess.unsharp_mask(arr[:1024,:1024],3)
+    tiled = npprocess.unsharp_mask(arr,3)[:1024,:1024]
+    ## the halo covers the blur's reach, so only the image edge differs
+    reach = fastblur.blur_reach(3)
+    inner = (slice(0,1024-reach),slice(0,1024-reach))
+    assert np.allclose(tiled[inner],whole[inner],atol=1e-2)
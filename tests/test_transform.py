@@ -0,0 +1,60 @@
+'''Transform, against the same flips and turns done with numpy'''
+
+from __future__ import print_function, division
+import itertools
+import numpy as np
+import pytest
+
+from transform import Transform
+
+ALL = [Transform(hflip=h,turns=t)
+       for h,t in itertools.product([False,True],range(4))]
+
+def grid(h=3,w=5):
+    return np.arange(h*w).reshape(h,w)
+
+def by_steps(t,arr):
+    '''apply t with numpy, following its steps()'''
+    for step,arg in t.steps():
+        if step == 'flip':
+            arr = arr[:,::-1] if arg == 'horizontal' else arr[::-1]
+        else:
+            arr = np.rot90(arr,-arg)
+    return arr
+
+@pytest.mark.parametrize('t',ALL,ids=repr)
+def test_array_follows_steps(t):
+    assert np.array_equal(t.array(grid()),by_steps(t,grid()))
+
+def test_flips_and_turns():
+    arr = grid()
+    assert np.array_equal(Transform(hflip=True).array(arr),arr[:,::-1])
+    assert np.array_equal(Transform(vflip=True).array(arr),arr[::-1])
+    assert np.array_equal(Transform(turns=1).array(arr),np.rot90(arr,-1))
+    assert np.array_equal(Transform(turns=-1).array(arr),np.rot90(arr))
+
+@pytest.mark.parametrize('t',ALL,ids=repr)
+def test_inverse_undoes(t):
+    t = t.copy().move(3,-2)
+    assert t.copy().then(t.inverse()).is_identity()
+    assert t.inverse().copy().then(t).is_identity()
+    assert np.array_equal(t.inverse().array(t.array(grid())),grid())
+
+@pytest.mark.parametrize('a,b',list(itertools.product(ALL,ALL)))
+def test_then_is_one_after_the_other(a,b):
+    both = a.copy().then(b)
+    assert np.array_equal(both.array(grid()),b.array(a.array(grid())))
+
+@pytest.mark.parametrize('t',ALL,ids=repr)
+def test_point_and_rect_follow_the_array(t):
+    h,w = 3,5
+    arr = grid(h,w)
+    out = t.array(arr)
+    assert out.shape == t.shape(h,w)
+    for y in range(h):
+        for x in range(w):
+            ## a pixel goes where its center goes
+            px,py = t.point(x+0.5,y+0.5,w,h)
+            assert out[int(py),int(px)] == arr[y,x]
+    x,y,rw,rh = t.rect(1,0,3,2,w,h)
+    assert sorted(out[y:y+rh,x:x+rw].ravel()) == sorted(arr[0:2,1:4].ravel())
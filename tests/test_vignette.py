@@ -0,0 +1,84 @@
+'''the blurred ellipse, evaluated directly, and the vignette made from it'''
+
+from __future__ import print_function, division
+import numpy as np
+import pytest
+
+import fastblur
+import npprocess
+import tiles
+
+def ellipse(h,w,inside,outside):
+    return tiles.fill_tiles(npprocess.ellipse_kernel(0,h,0,w,inside,outside),
+                            h,w)
+
+def true_blur(plane,sigma):
+    '''a Gaussian blur with edges clamped, by plain convolution'''
+    r = int(np.ceil(6*sigma))
+    x = np.arange(-r,r+1)
+    k = np.exp(-x*x/(2*sigma*sigma))
+    k /= k.sum()
+    plane = plane.astype(np.float64)
+    for axis in (0,1):
+        pad = [(r,r) if a == axis else (0,0) for a in (0,1)]
+        plane = np.apply_along_axis(lambda line: np.convolve(line,k,'valid'),
+                                    axis,np.pad(plane,pad,mode='edge'))
+    return plane
+
+@pytest.mark.parametrize('h,w,sigma',[(90,140,6.),(61,77,3.5),(120,100,15.)])
+def test_ellipse_blur_is_the_blurred_ellipse(h,w,sigma):
+    got = fastblur.gauss_blur_ellipse(h,w,sigma,1.,0.)
+    assert got.shape == (h,w) and got.dtype == np.float32
+    assert np.abs(got - true_blur(ellipse(h,w,1.,0.),sigma)).max() < 0.003
+
+def test_ellipse_blur_inside_and_outside():
+    h,w,sigma = 80,100,5.
+    got = fastblur.gauss_blur_ellipse(h,w,sigma,0.2,0.9)
+    ref = true_blur(ellipse(h,w,0.2,0.9),sigma)
+    assert np.abs(got - ref).max() < 0.003*0.7
+
+def test_ellipse_without_blur():
+    got = fastblur.gauss_blur_ellipse(30,40,0,1.,0.25)
+    assert np.allclose(got,0.25)
+
+def pdb_vignette(h,w,lighten_corners,sigma):
+    '''
+    as vignette_pdb: white (or black) corners, a 50% gray ellipse, then
+    blurred (the GIMP blurs in linear light)
+    '''
+    corner = 255 if lighten_corners else 0
+    plane = ellipse(h,w,128,corner)
+    lin = npprocess.srgb_to_linear(plane.astype(np.uint8))
+    return npprocess.linear_to_srgb(fastblur.gauss_blur(lin,sigma))
+
+@pytest.mark.parametrize('lighten_corners',[True,False])
+def test_vignette_is_close_to_the_pdb_steps(lighten_corners):
+    h,w = 150,220
+    sigma = fastblur.wide_blur_sigma(40)
+    arr = npprocess.vignette(h,w,lighten_corners,sigma,3)
+    assert arr.shape == (h,w,3)
+    ## every channel is the same gray
+    assert (arr == arr[...,:1]).all()
+    ref = pdb_vignette(h,w,lighten_corners,sigma)
+    assert np.abs(arr[...,0].astype(float) - ref).max() <= 2.5
+    ## mid-gray in the middle; the corners lighter (or darker)
+    assert abs(int(arr[h//2,w//2,0]) - 128) <= 1
+    if lighten_corners:
+        assert arr[0,0,0] > 200
+    else:
+        assert arr[0,0,0] < 60
+
+def test_vignette_gray_with_alpha():
+    arr = npprocess.vignette(50,60,True,4.,2,has_alpha=True)
+    assert arr.shape == (50,60,2)
+    assert (arr[...,1] == 255).all()
+
+def test_vignette_spread_keeps_the_grays():
+    plain = npprocess.vignette(60,80,False,6.,3)
+    spread = npprocess.vignette(60,80,False,6.,3,spread_by=5,seed=1)
+    ## spread only moves pixels around
+    assert not np.array_equal(plain,spread)
+    assert abs(plain.astype(float).mean() - spread.astype(float).mean()) < 1
+    assert np.array_equal(spread,
+                          npprocess.vignette(60,80,False,6.,3,spread_by=5,
+                                             seed=1))
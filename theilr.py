@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# GIMP Python plug-in that registers all of the theilr procedures at once
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License at http://www.gnu.org/licenses for
+# more details.
+
+## One file, so one python interpreter when the GIMP queries its
+## plug-ins, instead of one for each of wideblur.py, cheaphdr.py, etc.
+## Install this *instead of* those files (along with procedures.py,
+## process.py, and the rest); see procedures.py for the table.
+
+from gimpfu import *
+import procedures
+
+procedures.register()
+
+main()
@@ -0,0 +1,81 @@
+'''Tile-parallel execution of numpy kernels over images'''
+
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License at http://www.gnu.org/licenses for
+# more details.
+
+## numpy releases the GIL inside its loops, so plain threads give real
+## speedup here.  The tiles work on arrays that were read in one piece
+## (see pixels.py); libgimp calls themselves are not thread-safe, so
+## drawables are only read and written from the calling thread.
+
+from __future__ import print_function, division
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import numpy as np
+
+## default number of worker threads; change it with set_workers()
+WORKERS = multiprocessing.cpu_count()
+
+## tiles are (up to) TILE_SIZE x TILE_SIZE, plus any halo
+TILE_SIZE = 1024
+
+def set_workers(n):
+    '''set the default number of worker threads (1 means no threads)'''
+    global WORKERS
+    WORKERS = max([1,int(n)])
+
+def tile_rects(h,w,size=TILE_SIZE):
+    '''(y0,y1,x0,x1) of the tiles that cover an h x w image'''
+    return [(y,min([y+size,h]),x,min([x+size,w]))
+            for y in range(0,h,size) for x in range(0,w,size)]
+
+def run(fcn,jobs,workers=None):
+    '''[fcn(job) for job in jobs], on a pool of worker threads'''
+    workers = min([workers or WORKERS,len(jobs)])
+    if workers <= 1:
+        return [fcn(job) for job in jobs]
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(fcn,jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+def fill_tiles(kernel,h,w,size=TILE_SIZE,workers=None):
+    '''
+    build an h x w array tile by tile; kernel(y0,y1,x0,x1) returns
+    the tile for rows y0:y1 and columns x0:x1
+    '''
+    rects = tile_rects(h,w,size)
+    ## first tile tells us the dtype and channels of the output
+    first = kernel(*rects[0])
+    out = np.empty((h,w)+first.shape[2:],dtype=first.dtype)
+    def do_tile(r):
+        y0,y1,x0,x1 = r
+        out[y0:y1,x0:x1] = first if r == rects[0] else kernel(y0,y1,x0,x1)
+    run(do_tile,rects,workers)
+    return out
+
+def map_tiles(kernel,src,halo=0,size=TILE_SIZE,workers=None):
+    '''
+    kernel(src), computed tile by tile; kernel must return an array of
+    the same height and width as its input (channels and dtype may
+    change).  halo is how far the kernel's output depends on pixels
+    outside a tile: that much extra is handed to it, then cropped off,
+    so the result is the same as applying the kernel to the whole.
+    '''
+    h,w = src.shape[:2]
+    def tile(y0,y1,x0,x1):
+        ya,yb = max([y0-halo,0]),min([y1+halo,h])
+        xa,xb = max([x0-halo,0]),min([x1+halo,w])
+        res = kernel(src[ya:yb,xa:xb])
+        return res[y0-ya:y1-ya,x0-xa:x1-xa]
+    return fill_tiles(tile,h,w,size,workers)
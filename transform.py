@@ -0,0 +1,136 @@
+'''Flips, quarter turns and offsets, collected and applied all at once'''
+
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License at http://www.gnu.org/licenses for
+# more details.
+
+## Any sequence of horizontal and vertical flips and quarter turns comes
+## down to (at most) one horizontal flip followed by some clockwise
+## quarter turns: a Transform keeps just that, plus an offset, and is
+## applied only once the pixels are needed -- to an array as a view
+## (no copy at all), to a layer as at most two lossless pdb transforms
+## (see process.transform_layer), or to the rectangle a layer covers.
+## Neither gimpfu nor numpy is needed here.
+
+from __future__ import print_function, division
+
+class Transform(object):
+    '''
+    a horizontal flip (if mirror), then turns clockwise quarter turns,
+    then a move by (dx,dy); flips and turns are about the center
+    '''
+    def __init__(self,hflip=False,vflip=False,turns=0,dx=0,dy=0):
+        self.mirror = False
+        self.turns = 0
+        self.dx,self.dy = dx,dy
+        self.flip(hflip,vflip)
+        self.rotate(turns)
+
+    def __repr__(self):
+        return 'Transform(hflip=%s,turns=%d,dx=%d,dy=%d)' % (
+            self.mirror,self.turns,self.dx,self.dy)
+
+    def __eq__(self,other):
+        return (self.mirror,self.turns,self.dx,self.dy) == \
+            (other.mirror,other.turns,other.dx,other.dy)
+
+    def __ne__(self,other):
+        return not self == other
+
+    def copy(self):
+        return Transform().then(self)
+
+    def flip(self,hflip=False,vflip=False):
+        '''flip horizontally and/or vertically (in that order)'''
+        ## a flip turns the other way round: H R^t = R^-t H,
+        ## and a vertical flip is a horizontal one, turned over: V = R^2 H
+        if hflip:
+            self.mirror = not self.mirror
+            self.turns = -self.turns % 4
+        if vflip:
+            self.mirror = not self.mirror
+            self.turns = (2-self.turns) % 4
+        return self
+
+    def rotate(self,turns):
+        '''turn by a number of clockwise quarter turns (negative: ccw)'''
+        self.turns = (self.turns + turns) % 4
+        return self
+
+    def move(self,dx,dy):
+        self.dx += dx
+        self.dy += dy
+        return self
+
+    def then(self,other):
+        '''this transform, followed by other'''
+        if other.mirror:
+            self.mirror = not self.mirror
+            self.turns = -self.turns % 4
+        self.rotate(other.turns)
+        return self.move(other.dx,other.dy)
+
+    def inverse(self):
+        '''the transform that undoes this one'''
+        turns = self.turns if self.mirror else -self.turns
+        return Transform(hflip=self.mirror,turns=turns,dx=-self.dx,dy=-self.dy)
+
+    def is_identity(self):
+        return not (self.mirror or self.turns or self.dx or self.dy)
+
+    def swaps_axes(self):
+        return self.turns % 2 == 1
+
+    def steps(self):
+        '''
+        the transform as the fewest flips and turns: a list of
+        ('flip','horizontal'|'vertical') and ('rotate',turns), in order
+        '''
+        if not self.mirror:
+            return [('rotate',self.turns)] if self.turns else []
+        if self.turns == 2:
+            return [('flip','vertical')]
+        steps = [('flip','horizontal')]
+        if self.turns:
+            steps.append(('rotate',self.turns))
+        return steps
+
+    def shape(self,h,w):
+        '''(h,w) of an h x w image, once transformed'''
+        return (w,h) if self.swaps_axes() else (h,w)
+
+    def array(self,arr):
+        '''
+        the (h,w,...) array arr, flipped and turned: a view, not a copy
+        (the offset does not apply to arrays)
+        '''
+        if self.mirror:
+            arr = arr[:,::-1]
+        for _ in range(self.turns):
+            arr = arr[::-1].swapaxes(0,1)
+        return arr
+
+    def point(self,x,y,width,height):
+        '''
+        where the point (x,y) goes, if the width x height frame it is
+        measured in is flipped and turned (then moved) as a whole
+        '''
+        if self.mirror:
+            x = width - x
+        for _ in range(self.turns):
+            x,y = height - y,x
+            width,height = height,width
+        return x+self.dx,y+self.dy
+
+    def rect(self,x,y,w,h,width,height):
+        '''(x,y,w,h) of the rectangle (x,y,w,h), transformed as in point'''
+        xa,ya = self.point(x,y,width,height)
+        xb,yb = self.point(x+w,y+h,width,height)
+        return min([xa,xb]),min([ya,yb]),abs(xb-xa),abs(yb-ya)